@@ -56,7 +56,7 @@ class BaseSocket:
             raise socket.error("sendCommand() on a disconnected socket")
 
         try:
-            self.sock.send(bytearray(cmd + '\n', 'utf-8'))
+            self.sock.sendall(bytearray(cmd + '\n', 'utf-8'))
         except socket.error as error:
             self.disconnect()
             raise socket.error("Fail to send command: {}, error: {}", cmd, error)
@@ -67,7 +67,7 @@ class BaseSocket:
 
         try:
             reply = self.sock.recv(4096)
-            while not reply.endswith('\x0a'):
+            while not reply.endswith(b'\x0a'):
                 reply += self.sock.recv(4096)
             if reply.find(b'---^') != -1 or reply.find(b'^---') != -1:
                 # read next line for actual message
@@ -80,6 +80,21 @@ class BaseSocket:
         logger.debug('Reply message({})'.format(str_reply))
         return str_reply
 
+    def readData(self):
+        """ Read whatever is available on the socket (at least one complete line), with no error echo handling. """
+        if not self.connected:
+            raise socket.error("readData() on a disconnected socket")
+
+        try:
+            data = self.sock.recv(4096)
+            while not data.endswith(b'\x0a'):
+                data += self.sock.recv(4096)
+        except Exception as error:
+            self.disconnect()
+            raise IOError('Fail to read response, error: {}'.format(error))
+
+        return data.decode("utf-8")
+
     def sendQuery(self, query):
         logger.debug('sendQuery({})'.format(query))
         self.sendCommand(query)
@@ -5,6 +5,8 @@ Base classes and utilities for all Xena Manager (Xena) objects.
 """
 
 import logging
+import threading
+from collections import OrderedDict
 
 from xenavalkyrie.api.xena_socket import XenaSocket
 
@@ -120,3 +122,98 @@ class XenaCliWrapper(object):
         :rtype: list(int)
         """
         return [int(v) for v in self.get_attribute(obj, stat_name).split()]
+
+    #
+    # Batch operations.
+    #
+    # Batch is a list of (object, command, argument, ...) tuples. Commands are grouped per chassis, sent in pipeline on
+    # each chassis socket (chassis in parallel) and replies are returned in the batch order.
+    #
+
+    def send_command_batch(self, batch):
+        """ Send batch of commands and do not parse output (except for communication errors).
+
+        :param batch: list of (object, command, argument, ...) tuples.
+        """
+        self._send_batch(batch, lambda socket, commands: socket.sendQueriesVerify(commands))
+
+    def send_command_return_batch(self, batch):
+        """ Send batch of commands and wait for single line output per command.
+
+        :param batch: list of (object, command, argument, ...) tuples.
+        :return: list of commands outputs.
+        """
+        replies = self._send_batch(batch, lambda socket, commands: socket.sendQueries(commands))
+        return [item[0]._extract_return(item[1], reply) for item, reply in zip(batch, replies)]
+
+    def send_command_return_multilines_batch(self, batch):
+        """ Send batch of commands and wait for multiple lines output per command.
+
+        :param batch: list of (object, command, argument, ...) tuples.
+        :return: list of commands outputs, each output is list of lines.
+        """
+        return self._send_batch(batch, lambda socket, commands: socket.sendQueries(commands, True))
+
+    def get_attribute_batch(self, batch):
+        """ Returns list of objects attributes.
+
+        :param batch: list of (object, attribute) tuples.
+        :returns: list of returned values.
+        :rtype: list(str)
+        """
+        raw_returns = self.send_command_return_batch([(obj, attribute, '?') for obj, attribute in batch])
+        return [r[1:-1] if len(r) > 2 and r[0] == '"' and r[-1] == '"' else r for r in raw_returns]
+
+    def get_stats_batch(self, batch):
+        """ Send CLI commands that return list of integer counters.
+
+        :param batch: list of (object, statistics command name) tuples.
+        :return: list of counters lists.
+        :rtype: list(list(int))
+        """
+        return [[int(v) for v in values.split()] for values in self.get_attribute_batch(batch)]
+
+    def _send_batch(self, batch, send):
+        per_chassis = OrderedDict()
+        for position, item in enumerate(batch):
+            obj, command, arguments = item[0], item[1], item[2:]
+            per_chassis.setdefault(obj.chassis, []).append((position, obj._build_index_command(command, *arguments)))
+
+        replies = [None] * len(batch)
+
+        def send_chassis(chassis, positions_commands):
+            chassis_replies = send(self.sockets_list[chassis], [c for _, c in positions_commands]) or []
+            for (position, _), reply in zip(positions_commands, chassis_replies):
+                replies[position] = reply
+
+        run_parallel(send_chassis, per_chassis.items())
+        return replies
+
+
+def run_parallel(function, args_list):
+    """ Run function for each arguments tuple in parallel threads and re-raise the first exception (if any).
+
+    :param function: function to run.
+    :param args_list: list of arguments tuples, one thread per tuple.
+    """
+
+    args_list = list(args_list)
+    if len(args_list) == 1:
+        function(*args_list[0])
+        return
+
+    errors = []
+
+    def run(*args):
+        try:
+            function(*args)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -151,6 +151,59 @@ class XenaRestWrapper(object):
         """
         return [int(v) for v in self.send_command_return(obj, stat_name, '?').split()]
 
+    #
+    # Batch operations.
+    #
+    # REST server has no pipeline so batch operations are performed one by one, they are here to provide the same API
+    # as the CLI wrapper.
+    #
+
+    def send_command_batch(self, batch):
+        """ Send batch of commands with no output.
+
+        :param batch: list of (object, command, argument, ...) tuples.
+        """
+        for item in batch:
+            obj, command, arguments = item[0], item[1], item[2:]
+            if command == getattr(obj, 'create_command', None):
+                self.create(obj)
+            else:
+                self.send_command(obj, command, *arguments)
+
+    def send_command_return_batch(self, batch):
+        """ Send batch of commands with single line output.
+
+        :param batch: list of (object, command, argument, ...) tuples.
+        :return: list of commands outputs.
+        """
+        return [self.send_command_return(item[0], item[1], *item[2:]) for item in batch]
+
+    def send_command_return_multilines_batch(self, batch):
+        """ Send batch of commands with multiple lines output.
+
+        :param batch: list of (object, command, argument, ...) tuples.
+        :return: list of commands outputs, each output is list of lines.
+        """
+        return [self.send_command_return_multilines(item[0], item[1], *item[2:]) for item in batch]
+
+    def get_attribute_batch(self, batch):
+        """ Returns list of objects attributes.
+
+        :param batch: list of (object, attribute) tuples.
+        :returns: list of returned values.
+        :rtype: list(str)
+        """
+        return [self.get_attribute(obj, attribute) for obj, attribute in batch]
+
+    def get_stats_batch(self, batch):
+        """ Send CLI commands that return list of integer counters.
+
+        :param batch: list of (object, statistics command name) tuples.
+        :return: list of counters lists.
+        :rtype: list(list(int))
+        """
+        return [self.get_stats(obj, stat_name) for obj, stat_name in batch]
+
     def keep_alive(self):
         """ Send keep alive message. """
         self.logger.debug("Send KeepAlive message")
@@ -14,9 +14,13 @@ class XenaCommandError(Exception):
 class XenaSocket(object):
 
     reply_ok = '<OK>'
+    reply_sync = '<SYNC>'
     reply_errors = ('#Syntax error', '#Index error', '#Internal deparse error',
                     '<BADPARAMETER>', '<BADINDEX>', '<BADPORT>', '<NOTRESERVED>', '<NOTWRITABLE>')
 
+    pipeline_window = 256
+    """ Maximum number of commands sent in pipeline before waiting for their replies. """
+
     def __init__(self, logger, hostname, port=22611, timeout=5):
         self.logger = logger
         self.hostname = hostname
@@ -98,6 +102,50 @@ class XenaSocket(object):
                 msgnew = self.bsocket.readReply()
                 msg = msgleft + msgnew
 
+    def __sendPipelineReplies(self, cmds, multilines):
+        # For single line responses send all commands followed by one SYNC and expect one reply per command.
+        # For multiline responses send SYNC after each command to find out where each command replies end.
+        if multilines:
+            lines = [l for cmd in cmds for l in (cmd.strip('\n'), 'SYNC')]
+        else:
+            lines = [cmd.strip('\n') for cmd in cmds] + ['SYNC']
+        self.access_semaphor.acquire()
+        try:
+            self.last_command_timestamp = time.time()
+            self.bsocket.sendCommand('\n'.join(lines))
+            groups = self.__readSyncGroups(len(cmds) if multilines else 1)
+        finally:
+            self.access_semaphor.release()
+
+        if multilines:
+            return [[reply + '\n' for reply in group] for group in groups]
+        if len(groups[0]) != len(cmds):
+            raise XenaCommandError('Pipeline: expected {} replies, got {} - {}'.format(len(cmds), len(groups[0]),
+                                                                                    groups[0]))
+        return groups[0]
+
+    def __readSyncGroups(self, count):
+        groups = []
+        group = []
+        msg = ''
+        while len(groups) < count:
+            if '\n' not in msg:
+                msg += self.bsocket.readData()
+                continue
+            reply, msg = msg.split('\n', 1)
+            if '---^' in reply or '^---' in reply:
+                # Syntax error - the chassis echoes the command, marks the error position and then replies with the
+                # error, drop the echo and the marker so the error stays aligned with its command.
+                if group:
+                    group.pop()
+                continue
+            if reply.startswith(self.reply_sync):
+                groups.append(group)
+                group = []
+            else:
+                group.append(reply)
+        return groups
+
     def __sendQueryReply(self, cmd):
         self.access_semaphor.acquire()
         self.last_command_timestamp = time.time()
@@ -133,6 +181,51 @@ class XenaSocket(object):
             self.logger.debug('reply({})'.format(reply))
             return reply
 
+    def sendQueries(self, cmds, multilines=False):
+        """ Send list of commands in pipeline, wait for all responses, test for errors and return the returned codes.
+
+        Commands are sent in windows of pipeline_window commands, each window followed by SYNC, so the list costs one
+        round trip per window instead of one round trip per command.
+
+        :param cmds: list of commands to send
+        :param multilines: True - multiline response per command, False - single line response per command.
+        :return: list of commands return values, for multiline responses each value is list of lines.
+        """
+        self.logger.debug('sendQueries({} commands)'.format(len(cmds)))
+        if not self.is_connected():
+            raise socket.error('sendQueries on a disconnected socket')
+
+        replies = []
+        for i in range(0, len(cmds), self.pipeline_window):
+            replies.extend(self.__sendPipelineReplies(cmds[i:i + self.pipeline_window], multilines))
+
+        errors = []
+        for cmd, reply in zip(cmds, replies):
+            lines = reply if multilines else [reply]
+            errors.extend('{} - {}'.format(cmd, l.strip()) for l in lines if l.startswith(XenaSocket.reply_errors))
+        if errors:
+            raise XenaCommandError('sendQueries replies({})'.format(errors))
+        return replies
+
+    def sendQueriesVerify(self, cmds):
+        """ Send list of commands without return value in pipeline, wait for completion, verify success.
+
+        :param cmds: list of commands to send
+        """
+        cmds = [cmd.strip() for cmd in cmds]
+        self.logger.debug('sendQueriesVerify({} commands)'.format(len(cmds)))
+        if not self.is_connected():
+            raise socket.error('sendQueriesVerify on a disconnected socket')
+
+        replies = []
+        for i in range(0, len(cmds), self.pipeline_window):
+            replies.extend(self.__sendPipelineReplies(cmds[i:i + self.pipeline_window], False))
+
+        failures = ['{} - {}'.format(c, r) for c, r in zip(cmds, replies) if r != self.reply_ok]
+        if failures:
+            raise XenaCommandError('Commands Fail Expected {} Actual {}'.format(self.reply_ok, failures))
+        self.logger.debug('sendQueriesVerify({} commands) Succeed'.format(len(cmds)))
+
     def sendQueryVerify(self, cmd):
         """ Send command without return value, wait for completion, verify success.
 
@@ -7,14 +7,15 @@
 import sys
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, SUPPRESS
 import logging
-import time
 import json
 
 from trafficgenerator.tgn_utils import ApiType
 from xenavalkyrie.xena_app import init_xena
+from xenavalkyrie.xena_object import save_objects_config
 from xenavalkyrie.xena_port import XenaPort
 from xenavalkyrie.xena_stream import XenaStreamState
 from xenavalkyrie.xena_statistics_view import XenaPortsStats
+from xenavalkyrie.xena_stats_export import XenaStatsCsvWriter, XenaStatsJsonWriter
 
 
 version = 0.3
@@ -64,6 +65,10 @@ def xena_line_test(args=None):
                              help='Results output file')
     run_analyze.add_argument('-c', '--counters', required=False, default=SUPPRESS, nargs='+', metavar='counter',
                              help='List of counters to save in output file. (default: all)')
+    run_analyze.add_argument('-f', '--format', required=False, default='legacy', choices=['legacy', 'stream'],
+                             help='Results format. legacy - CSV (port, counters) if counters are specified else '
+                                  'indented JSON. stream - timestamped CSV if counters are specified else JSON Lines '
+                                  '(.gz/.xz extension for compressed output)')
 
     # Process arguments
     parsed_args = parser.parse_args(args)
@@ -83,11 +88,7 @@ def save_config(parsed_args):
     else:
         ports = parsed_args.ports
 
-    with open(parsed_args.output, 'w+') as _:
-        pass
-
-    for port in ports:
-        inventory_ports[port].save_config(parsed_args.output, 'a+')
+    save_objects_config([inventory_ports[port] for port in ports], parsed_args.output)
 
     chassis.api.disconnect()
 
@@ -123,26 +124,31 @@ def run_test(parsed_args):
         for stream in port.streams.values():
             stream.set_state(XenaStreamState.enabled)
 
-    chassis.start_traffic()
-    time.sleep(parsed_args.time)
-    chassis.stop_traffic()
-
-    time.sleep(2)
+    chassis.parent.run_traffic(parsed_args.time, None, None, False, *chassis.ports.values())
 
     counters = parsed_args.counters if hasattr(parsed_args, 'counters') else None
-    with open(parsed_args.results, 'w+') as f:
-        ports_stats = XenaPortsStats(chassis.parent)
-        ports_stats.read_stats()
+    ports_stats = XenaPortsStats(chassis.parent, counters)
+    if parsed_args.format == 'stream':
+        table = ports_stats.read_tables()
         if counters:
-            f.write('port,{}\n'.format(','.join(counters)))
-            for port in chassis.ports:
-                line = port
-                for counter in counters:
-                    line += ','
-                    line += str(ports_stats.get_flat_stats()[port][counter])
-                f.write('{}\n'.format(line))
+            # Counters can be groups (pr_total) or flat counters (pr_total_packets), the writer needs flat counters.
+            counters = ports_stats.plan.expand_counters()
+            with XenaStatsCsvWriter(parsed_args.results, columns=counters) as writer:
+                writer.write(table)
         else:
-            f.write(json.dumps(ports_stats.get_flat_stats(), indent=2))
+            with XenaStatsJsonWriter(parsed_args.results) as writer:
+                writer.write(table)
+    else:
+        ports_stats.read_stats()
+        flat_stats = ports_stats.get_flat_stats()
+        with open(parsed_args.results, 'w+') as f:
+            if counters:
+                counters = ports_stats.plan.expand_counters()
+                f.write('port,{}\n'.format(','.join(counters)))
+                for port in chassis.ports:
+                    f.write('{},{}\n'.format(port, ','.join(str(flat_stats[port][c]) for c in counters)))
+            else:
+                f.write(json.dumps(flat_stats, indent=2))
 
     for port in chassis.ports.values():
         port.release()
@@ -9,7 +9,7 @@ import pytest
 from xenavalkyrie.xena_app import init_xena
 from xenavalkyrie.xena_object import XenaAttributeError
 from xenavalkyrie.tests.test_base import TestXenaBase
-from trafficgenerator.tgn_utils import ApiType
+from trafficgenerator.tgn_utils import ApiType, TgnError
 
 
 class TestXenaErrors(TestXenaBase):
@@ -53,3 +53,18 @@ class TestXenaErrors(TestXenaBase):
             port.set_attributes(p_reservation=17)
         with pytest.raises(XenaAttributeError) as _:
             port.set_attributes(p_reservedby=17)
+
+    def test_reserve_taken(self):
+
+        self.xm.session.add_chassis(self.chassis)
+        port = self.xm.session.reserve_ports([self.port1, self.port2], True)[self.port1]
+        assert(len(self.xm.session.taken_ports) == 0)
+
+        other = init_xena(self.api, self.logger, 'other', self.server_ip, self.server_port)
+        other.session.add_chassis(self.chassis)
+        with pytest.raises(TgnError) as _:
+            other.session.reserve_ports([self.port1, self.port2])
+        other.session.reserve_ports([self.port1, self.port2], True)
+        assert(len(other.session.taken_ports) == 2)
+        assert(other.session.taken_ports[port.index] == self.config.get('Xena', 'owner'))
+        other.session.disconnect()
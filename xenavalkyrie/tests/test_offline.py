@@ -5,14 +5,23 @@ Base class for all Xena package tests.
 """
 
 from os import path
+import binascii
+import numpy
 import pytest
 import requests
 
+from pypacker.layer12 import ethernet
+from pypacker.layer3 import ip, ip6
+from pypacker.layer4 import udp
+
 from trafficgenerator.tgn_utils import ApiType, is_local_host
-from xenavalkyrie.xena_stream import XenaModifierType, XenaModifierAction
-from xenavalkyrie.xena_stream import XenaStream
+from xenavalkyrie.xena_stream import XenaModifierType, XenaModifierAction, XenaXModifier
+from xenavalkyrie.xena_stream import XenaStream, XenaStreamState
 from xenavalkyrie.tests.test_base import TestXenaBase
 from xenavalkyrie.xena_filter import XenaFilterState
+from xenavalkyrie.xena_headers import XenaHeadersTemplate
+from xenavalkyrie.xena_statistics_view import XenaStatsTable, XenaStatsDict, stream_loss
+from xenavalkyrie.xena_port import XenaTpld
 
 
 class TestXenaOffline(TestXenaBase):
@@ -48,6 +57,7 @@ class TestXenaOffline(TestXenaBase):
         assert(packet.ip.dst_s == '2.2.2.1')
         packet.dst_s = '33:33:33:33:33:33'
         packet.ip.dst_s = '3.3.3.3'
+        assert(port.streams[0].get_packet_headers().dst_s == '22:22:22:22:22:11')
         port.streams[0].set_packet_headers(packet)
         packet = port.streams[0].get_packet_headers()
         print(packet)
@@ -84,6 +94,33 @@ class TestXenaOffline(TestXenaBase):
         port.streams[0].remove_modifier(0)
         assert(port.streams[0].modifiers[0].max_val == 65535)
 
+    def test_hydrate(self):
+        #: :type port: xenavalkyrie.xena_port.XenaPort
+        port = self.xm.session.reserve_ports([self.port2])[self.port2]
+        port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_1.xpc'))
+        XenaStream.next_tpld_id = 0
+
+        port.hydrate()
+        assert(len(port.streams) == 2)
+        assert(XenaStream.next_tpld_id == 2)
+        assert(port.streams[0].name == 'Stream 1-1')
+        assert(port.streams[0].config['ps_tpldid'] == '0')
+        assert(len(port.streams[0].modifiers) == 1)
+        assert(port.streams[0].modifiers[0].action == XenaModifierAction.increment)
+        assert(port.streams[0].modifiers[0].max_val == 65535)
+        assert(port.streams[1].modifiers[0].action == XenaModifierAction.random)
+        assert(len(port.streams[1].xmodifiers) == 0)
+
+    def test_load_config_skip_if_loaded(self):
+        #: :type port: xenavalkyrie.xena_port.XenaPort
+        port = self.xm.session.reserve_ports([self.port2])[self.port2]
+        config_file = path.join(path.dirname(__file__), 'configs', 'test_config_1.xpc')
+
+        assert(port.load_config(config_file, skip_if_loaded=True))
+        assert(not port.load_config(config_file, skip_if_loaded=True))
+        port.streams[0].set_attributes(ps_comment='"modified"')
+        assert(port.load_config(config_file, skip_if_loaded=True))
+
     def test_extended_modifiers(self):
         try:
             port = self.xm.session.reserve_ports([self.port3])[self.port3]
@@ -109,6 +146,28 @@ class TestXenaOffline(TestXenaBase):
         port.streams[0].remove_modifier(0, m_type=XenaModifierType.extended)
         assert(len(port.streams[0].xmodifiers) == 0)
 
+    def test_set_modifiers(self):
+
+        #: :type port: xenavalkyrie.xena_port.XenaPort
+        port = self.xm.session.reserve_ports([self.port1], force=False, reset=True)[self.port1]
+        stream = port.add_stream('modifiers stream')
+
+        stream.set_modifiers([{'position': 4}, {'position': 8, 'action': XenaModifierAction.random}])
+        assert(len(stream.modifiers) == 2)
+        stream.del_objects_by_type('modifier')
+        assert(stream.modifiers[0].position == 4)
+        assert(stream.modifiers[0].max_val == 65535)
+        assert(stream.modifiers[1].action == XenaModifierAction.random)
+
+        stream.set_modifiers([{'position': 6}])
+        assert(len(stream.modifiers) == 1)
+        assert(stream.get_attribute('ps_modifiercount') == '1')
+
+        stream.set_modifiers(xmodifiers=[{'position': 10}])
+        stream.del_objects_by_type('xmodifier')
+        assert(stream.xmodifiers[0].mask == XenaXModifier.default_values['mask'])
+        assert(stream.xmodifiers[0].max_val == 0xffffff)
+
     def test_build_config(self):
 
         #: :type port: xenavalkyrie.xena_port.XenaPort
@@ -159,6 +218,117 @@ class TestXenaOffline(TestXenaBase):
 
         port.save_config(path.join(path.dirname(__file__), 'configs', 'save_config.xpc'))
 
+    def test_add_streams(self):
+
+        #: :type port: xenavalkyrie.xena_port.XenaPort
+        port = self.xm.session.reserve_ports([self.port1], force=False, reset=True)[self.port1]
+
+        streams = port.add_streams(16)
+        assert(len(port.streams) == 16)
+        assert(XenaStream.next_tpld_id == 16)
+        assert(streams[15].get_attribute('ps_tpldid') == '15')
+
+        streams = port.add_streams([{'name': 'named stream', 'tpld_id': 100, 'state': XenaStreamState.disabled,
+                                     'attributes': {'ps_packetlimit': 1000}}])
+        assert(len(port.streams) == 17)
+        assert(streams[0].get_attribute('ps_comment') == 'named stream')
+        assert(streams[0].get_attribute('ps_tpldid') == '100')
+        assert(streams[0].get_attribute('ps_enable') == 'OFF')
+        assert(streams[0].get_attribute('ps_packetlimit') == '1000')
+        assert(XenaStream.next_tpld_id == 101)
+
+    def test_headers_template(self):
+
+        template = XenaHeadersTemplate(ethernet.Ethernet(vlan=[ethernet.Dot1Q(vid=5)]) + ip.IP() + udp.UDP())
+        template.set_field('dst_mac', values=['00:00:00:00:00:{:02x}'.format(i) for i in range(16)])
+        template.set_field('vlan_id[0]', start=100)
+        template.set_field('dst_ip', start='10.0.0.255')
+        assert(template.ps_headerprotocol == 'ethernet vlan ip udp')
+
+        headers = template.headers(16)
+        assert(len(headers) == 16)
+        packet = ethernet.Ethernet(binascii.unhexlify(headers[1][2:]))
+        assert(packet.dst_s == '00:00:00:00:00:01')
+        assert(packet.vlan[0].vid == 101)
+        assert(packet.ip.dst_s == '10.0.1.0')
+        reference = ethernet.Ethernet(vlan=[ethernet.Dot1Q(vid=101)]) + ip.IP(dst_s='10.0.1.0') + udp.UDP()
+        assert(packet.ip.sum == ethernet.Ethernet(reference.bin()).ip.sum)
+
+        template = XenaHeadersTemplate(ethernet.Ethernet() + ip6.IP6() + udp.UDP())
+        template.set_field('dst_ip', start='1:2:3:4:5:6:7:888')
+        template.set_field('src_port', start=1, step=-1)
+        headers = template.generate(3)
+        packet = ethernet.Ethernet(headers[2].tobytes())
+        assert(packet.ip6.dst_s == '1:2:3:4:5:6:7:88a')
+        assert(packet.ip6.udp.sport == 65535)
+        template.set_field('dst_port', values=[1, 2])
+        with pytest.raises(ValueError):
+            template.generate(3)
+
+    def test_stats_delta(self):
+
+        ports = list(self.xm.session.reserve_ports([self.port1, self.port2]).values())
+        columns = [('pt_total', 'bps'), ('pt_total', 'packets')]
+        earlier = XenaStatsTable(ports, columns, numpy.array([[100, 2**63 - 5], [100, 10]]), numpy.array([1.0, 1.0]))
+        later = XenaStatsTable(ports, columns, numpy.array([[200, -2**63 + 5], [300, 30]]), numpy.array([3.0, 2.0]))
+        delta = later - earlier
+        assert(delta.values.tolist() == [[200, 10], [300, 20]])
+        assert(delta.rates().tolist() == [[200, 5], [300, 20]])
+        assert(delta[ports[1]]['pt_total']['packets'] == 20)
+        assert(not delta.resets.any())
+
+        reset = XenaStatsTable(ports, columns, numpy.array([[100, 3], [100, 40]]), numpy.array([4.0, 4.0])) - later
+        assert(reset.values.tolist() == [[100, 3], [100, 10]])
+        assert(reset.resets.tolist() == [[False, True], [False, False]])
+        with pytest.raises(ValueError):
+            later - XenaStatsTable(ports, columns[:1], numpy.array([[100], [100]]))
+
+        # Stream and TPLD added between the reads.
+        ports[0].load_config(path.join(path.dirname(__file__), 'configs', 'test_config_1.xpc'))
+        streams = list(ports[0].streams.values())
+        tplds = [XenaTpld(parent=ports[1], index='{}/{}'.format(ports[1].index, s.get_tpld_id())) for s in streams]
+        tx_columns = [(None, 'packets')]
+        rx_columns = [('pr_tpldtraffic', 'pac')]
+        tx_delta = XenaStatsTable(streams[::-1], tx_columns, numpy.array([[50], [30]])) - \
+            XenaStatsTable(streams[:1], tx_columns, numpy.array([[10]]))
+        rx_delta = XenaStatsTable(tplds[::-1], rx_columns, numpy.array([[40], [25]])) - \
+            XenaStatsTable(tplds[:1], rx_columns, numpy.array([[10]]))
+        lost, ratio = stream_loss(tx_delta, rx_delta)
+        assert(lost.tolist() == [5])
+        assert(ratio.tolist() == [0.25])
+
+    def test_stats_dict(self):
+
+        ports = list(self.xm.session.reserve_ports([self.port1, self.port2]).values())
+        table = XenaStatsTable(ports, [('pt_total', 'bps'), ('pt_total', 'packets')], numpy.array([[1, 2], [3, 4]]))
+        built = []
+        statistics = XenaStatsDict(table.rows, lambda o: built.append(o) or table[o])
+        assert(len(statistics) == 2)
+        assert(not built)
+        assert(statistics[ports[1].name]['pt_total']['packets'] == 4)
+        assert(built == [ports[1]])
+        assert(statistics['no such port'] is None)
+        assert(statistics.get('no such port', {}) == {})
+        statistics[ports[1]]['pt_total']['packets'] = 0
+        assert(statistics[ports[1]]['pt_total']['packets'] == 0)
+        assert(built == [ports[1]])
+
+    def test_save_config(self):
+
+        #: :type port: xenavalkyrie.xena_port.XenaPort
+        port = self.xm.session.reserve_ports([self.port2])[self.port2]
+        port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_1.xpc'))
+
+        save_config = path.join(path.dirname(__file__), 'configs', 'save_config.xmc')
+        port.parent.modules[int(port.index.split('/')[0])].save_config(save_config)
+        with open(save_config) as f:
+            lines = f.read().splitlines()
+        assert(lines[0] == ';Module: {}'.format(port.index.split('/')[0]))
+        port_lines = [l for l in lines if l.startswith(';Port:')]
+        assert(port_lines == sorted(port_lines))
+        assert(';Port: {}'.format(port.index) in port_lines)
+        assert(lines[lines.index(';Port: {}'.format(port.index)) + 1] == 'P_RESET')
+
     def test_rest_server(self):
 
         if self.api == ApiType.rest:
@@ -11,10 +11,14 @@ from os import path
 import json
 import binascii
 import time
+import pytest
 
 from pypacker.layer12 import ethernet
 
-from xenavalkyrie.xena_statistics_view import XenaPortsStats, XenaStreamsStats, XenaTpldsStats
+from xenavalkyrie.xena_statistics_view import XenaPortsStats, XenaStreamsStats, XenaTpldsStats, XenaStatsPlan
+from xenavalkyrie.xena_stats_export import XenaStatsCsvWriter
+from xenavalkyrie.xena_stats_sampler import StatsSampler
+from xenavalkyrie.xena_stats_archive import XenaStatsArchive
 from xenavalkyrie.tests.test_base import TestXenaBase
 from xenavalkyrie.xena_port import XenaCaptureBufferType
 from xenavalkyrie.xena_tshark import Tshark, TsharkAnalyzer
@@ -26,6 +30,7 @@ class TestXenaOnline(TestXenaBase):
         self.ports = self.xm.session.reserve_ports([self.port1, self.port2], True)
         self.ports[self.port1].wait_for_up(16)
         self.ports[self.port2].wait_for_up(16)
+        assert(len(self.xm.session.wait_for_up(16)) == 2)
 
     def test_traffic(self):
         port = self.xm.session.reserve_ports([self.port1])[self.port1]
@@ -35,6 +40,9 @@ class TestXenaOnline(TestXenaBase):
         port_stats = port.read_port_stats()
         print(json.dumps(port_stats, indent=1))
         self.xm.session.start_traffic()
+        # Chassis wait_traffic without ports does not wait.
+        port.chassis.wait_traffic()
+        assert(port.get_attribute('p_traffic') == 'on')
         time.sleep(2)
         port_stats = port.read_port_stats()
         print(json.dumps(port_stats, indent=1))
@@ -47,6 +55,10 @@ class TestXenaOnline(TestXenaBase):
 
         ports_stats = XenaPortsStats(self.xm.session)
         ports_stats.read_stats()
+        assert(ports_stats.times[port].window < 1)
+        assert(ports_stats.skew == 0)
+        assert(ports_stats.tables['port'].column('pt_total', 'packets')[0] ==
+               ports_stats.statistics[port]['pt_total']['packets'])
         print(ports_stats.statistics.dumps())
         print(json.dumps(ports_stats.get_flat_stats(), indent=1))
 
@@ -60,6 +72,75 @@ class TestXenaOnline(TestXenaBase):
         print(tplds_stats.statistics.dumps())
         print(json.dumps(tplds_stats.get_flat_stats(), indent=1))
 
+    def test_traffic_synchronized(self):
+        ports = self.xm.session.reserve_ports([self.port1, self.port2], True)
+        for port in ports.values():
+            port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_loopback.xpc'))
+
+        traffic_start = self.xm.session.start_traffic_synchronized(True)
+        assert(len(traffic_start) == len(set(p.chassis for p in ports.values())))
+        assert(min(s.skew for s in traffic_start.values()) == 0)
+        assert(ports[self.port1].get_attribute('p_traffic') == 'off')
+
+    def test_run_traffic(self):
+        port = self.xm.session.reserve_ports([self.port1])[self.port1]
+        port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_loopback.xpc'))
+
+        elapsed = []
+        run = self.xm.session.run_traffic(4, 1, lambda session, t: elapsed.append(t))
+        assert(len(elapsed) == 3)
+        assert(abs(run.durations[port] - 4) < 0.1)
+        run = self.xm.session.run_traffic(2, None, None, True)
+        assert(abs(run.durations[port] - 2) < 0.01)
+        assert(port.get_attribute('p_txtimelimit') == '0')
+
+    def test_stats_sampler(self):
+        port = self.xm.session.reserve_ports([self.port1])[self.port1]
+        port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_loopback.xpc'))
+
+        archive_file = path.join(self.temp_dir, 'xena_stats.xstats')
+        sampler = StatsSampler([port], interval=0.5, capacity=4, archive=archive_file)
+        sampler.start()
+        self.xm.session.run_traffic(4)
+        sampler.stop()
+        timestamps, pr_total = sampler.latest('pr_total', 8)
+        assert(len(timestamps) == 4)
+        assert(pr_total.shape == (4, 1, 4))
+        packets = pr_total[:, 0, sampler.captions['pr_total'].index('packets')]
+        assert(packets[-1] >= packets[0])
+        # Samples taken while holding all samples must not change them.
+        all_pr_total = pr_total.copy()
+        sampler.sample()
+        assert((pr_total == all_pr_total).all())
+
+        archive = XenaStatsArchive(archive_file)
+        records = archive.query(objects=[port.ref], groups=['pr_total'])
+        assert(len(records) == sampler.count)
+        assert(records['counters'][-1, archive.captions['pr_total'].index('packets')] == packets[-1])
+
+    def test_stats_archive_same_names(self):
+        ports = self.xm.session.reserve_ports([self.port1, self.port2])
+        for port in ports.values():
+            port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_1.xpc'))
+        streams = [ports[self.port1].streams[0], ports[self.port2].streams[0]]
+        assert(streams[0].name == streams[1].name)
+
+        archive_file = path.join(self.temp_dir, 'xena_stats_names.xstats')
+        sampler = StatsSampler(streams, interval=0.5, capacity=4, archive=archive_file)
+        sampler.start()
+        ports[self.port1].start_traffic()
+        time.sleep(2)
+        ports[self.port1].stop_traffic()
+        sampler.stop()
+
+        archive = XenaStatsArchive(archive_file)
+        assert(archive.objects == [s.ref for s in streams])
+        assert(archive.names == [s.name for s in streams])
+        packets = archive.captions['pt_stream'].index('packets')
+        assert(len(archive.query(objects=[streams[0].ref])) == sampler.count)
+        assert(archive.query(objects=[streams[0].ref])['counters'][-1, packets] > 0)
+        assert(archive.query(objects=[streams[1].ref])['counters'][-1, packets] == 0)
+
     def test_stream_stats(self):
         """ For this test we need back-to-back ports. """
         ports = self.xm.session.reserve_ports([self.port1, self.port2])
@@ -86,6 +167,31 @@ class TestXenaOnline(TestXenaBase):
         assert(streams_stats.statistics['Stream 1-1']['rx'][ports[self.port2]]['pr_tpldtraffic']['pac'] == 8000)
         assert(streams_stats.statistics['Stream 1-1']['rx'][self.port2]['pr_tpldtraffic']['pac'] == 8000)
 
+    def test_stats_counters_names(self):
+        port = self.xm.session.reserve_ports([self.port1])[self.port1]
+        port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_1.xpc'))
+        streams = list(port.streams.values())
+
+        # Single group objects (streams) counters are selected by caption, like their table columns.
+        plan = XenaStatsPlan(streams + [port], counters=['packets', 'pr_total_packets'])
+        assert([g for _, g in plan.batch] == ['pt_stream'] * len(streams) + ['pr_total'])
+        assert(plan.expand_counters() == ['packets', 'pr_total_packets'])
+        assert(not XenaStatsPlan(streams, counters=['pt_stream_packets']).batch)
+        with pytest.raises(ValueError):
+            plan.expand_counters(['pt_stream_packets'])
+
+        tables = plan.read_tables()
+        csv_file = path.join(self.temp_dir, 'xena_stats_counters.csv')
+        with XenaStatsCsvWriter(csv_file, columns=plan.expand_counters(['packets'])) as writer:
+            writer.write(tables['stream'])
+        with open(csv_file) as f:
+            assert(f.readline().strip() == 'timestamp,object,packets')
+        # Rejected columns do not leave header without rows.
+        with XenaStatsCsvWriter(csv_file, columns=['pt_stream_packets']) as writer:
+            with pytest.raises(ValueError):
+                writer.write(tables['stream'])
+        assert(path.getsize(csv_file) == 0)
+
     def test_capture(self):
         port = self.xm.session.reserve_ports([self.port1])[self.port1]
         port.load_config(path.join(path.dirname(__file__), 'configs', 'test_config_loopback.xpc'))
@@ -111,6 +217,11 @@ class TestXenaOnline(TestXenaBase):
         print(packets[0])
         assert(len(packets) == 80)
 
+        progress = []
+        packets = port.capture.download_packets(window=32, callback=lambda p, total: progress.append(len(p)))
+        assert(progress == [32, 64, 80])
+        assert(ethernet.Ethernet(packets[0]).ip.dst_s == '1.1.0.0')
+
         tshark = Tshark(self.config.get('General', 'wireshark_dir'))
         packets = port.capture.get_packets(cap_type=XenaCaptureBufferType.pcap,
                                            file_name=path.join(self.temp_dir, 'xena_cap.pcap'), tshark=tshark)
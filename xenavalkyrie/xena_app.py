@@ -5,15 +5,28 @@ Classes and utilities that represents Xena XenaManager-2G application and chassi
 """
 
 import time
+import threading
+from collections import OrderedDict, namedtuple
 
 from trafficgenerator.tgn_app import TgnApp
-from trafficgenerator.tgn_utils import ApiType
+from trafficgenerator.tgn_utils import ApiType, TgnError
 from xenavalkyrie.api.xena_rest import XenaRestWrapper
-from xenavalkyrie.api.xena_cli import XenaCliWrapper
-from xenavalkyrie.xena_object import XenaObject
+from xenavalkyrie.api.xena_cli import XenaCliWrapper, run_parallel
+from xenavalkyrie.xena_object import (XenaObject, XenaObjectsDict, save_objects_config, wait_for_states_many, monotonic,
+                                      reserve_objects)
 from xenavalkyrie.xena_port import XenaPort
 
 
+XenaTrafficStart = namedtuple('XenaTrafficStart', ['sent', 'acknowledged', 'skew', 'uncertainty'])
+""" Traffic start times of single chassis - local monotonic time the start command was sent and acknowledged, estimated
+    start skew relative to the earliest chassis and skew uncertainty (half command round trip), all in seconds. """
+
+
+XenaRun = namedtuple('XenaRun', ['durations', 'elapsed', 'settle'])
+""" Traffic run results - dictionary {port: on-wire TX duration}, local run duration from start to stop acknowledge and
+    time from stop until RX counters settled, all in seconds. """
+
+
 def init_xena(api, logger, owner, ip=None, port=57911):
     """ Create XenaApp object.
 
@@ -52,6 +65,11 @@ class XenaApp(TgnApp):
 class XenaSession(XenaObject):
     """ Xena scripting object. Root object for the Xena objects tree. """
 
+    settle_interval = 0.1
+    """ Polling interval, in seconds, of RX counters after traffic stop. """
+    settle_timeout = 10
+    """ Maximum time, in seconds, to wait for RX counters to settle after traffic stop. """
+
     def __init__(self, logger, owner, api):
         """
         :param logger: python logger
@@ -62,6 +80,7 @@ class XenaSession(XenaObject):
         self.logger = logger
         self.api = api
         self.owner = owner
+        self.taken_ports = XenaObjectsDict()
 
         super(self.__class__, self).__init__(objType='session', index='', parent=None, objRef=owner)
         self.session = self
@@ -89,7 +108,10 @@ class XenaSession(XenaObject):
         return self.chassis_list[chassis]
 
     def disconnect(self):
-        """ Release ports and disconnect from all chassis. """
+        """ Release ports and disconnect from all chassis.
+
+        Ports are released in parallel per chassis - see release_ports.
+        """
 
         self.release_ports()
         self.api.disconnect()
@@ -106,15 +128,20 @@ class XenaSession(XenaObject):
         XenaManager-2G -> Reserve/Relinquish Port.
         XenaManager-2G -> Reserve Port.
 
+        All ports, on all chassis, are reserved (and reset) together - see xenavalkyrie.xena_object.reserve_objects.
+        Ports taken from other users are available in taken_ports as dictionary {port: previous owner}.
+
         :param locations: list of ports locations in the form <ip/slot/port> to reserve
         :param force: True - take forcefully. False - fail if port is reserved by other user
         :param reset: True - reset port, False - leave port configuration
         :return: ports dictionary (index: object)
         """
 
+        ports = []
         for location in locations:
             ip, module, port = location.split('/')
-            self.chassis_list[ip].reserve_ports(['{}/{}'.format(module, port)], force, reset)
+            ports.append(XenaPort(parent=self.chassis_list[ip], index='{}/{}'.format(module, port)))
+        self._reserve_ports(ports, force, reset)
 
         return self.ports
 
@@ -124,8 +151,7 @@ class XenaSession(XenaObject):
         XenaManager-2G -> Release Ports.
         """
 
-        for chassis in self._per_chassis_ports(*self._get_operation_ports()):
-            chassis.release_ports()
+        self._fan_out(lambda port: port.release(), *self._get_operation_ports())
 
     def start_traffic(self, blocking=False, *ports):
         """ Start traffic on list of ports.
@@ -134,11 +160,124 @@ class XenaSession(XenaObject):
         :param ports: list of ports to start traffic on. Default - all session ports.
         """
 
-        for chassis, chassis_ports in self._per_chassis_ports(*self._get_operation_ports(*ports)).items():
-            chassis.start_traffic(False, *chassis_ports)
+        ports = self._get_operation_ports(*ports)
+        for chassis, chassis_ports in self._per_chassis_ports(*ports).items():
+            chassis._send_traffic_command('on', *chassis_ports)
+        wait_for_states_many(ports, 'p_traffic', ['on'], 40)
         if blocking:
-            for chassis, chassis_ports in self._per_chassis_ports(*self._get_operation_ports(*ports)).items():
-                chassis.wait_traffic(*chassis_ports)
+            self.wait_traffic(*ports)
+
+    def start_traffic_synchronized(self, blocking=False, *ports):
+        """ Start traffic on list of ports, on all chassis at the same time.
+
+        Start commands are prepared in advance, one thread per chassis, and all threads send the command together
+        when all are ready. Each chassis start time is estimated as the middle of its command round trip.
+
+        :param blocking: True - start traffic and wait until traffic ends, False - start traffic and return.
+        :param ports: list of ports to start traffic on. Default - all session ports.
+        :return: dictionary {chassis: XenaTrafficStart} with the achieved start skew per chassis.
+        """
+
+        ports = self._get_operation_ports(*ports)
+        per_chassis_ports = self._per_chassis_ports(*ports)
+
+        # All chassis threads wait until the last one is ready, then all send the start command together.
+        lock = threading.Lock()
+        go = threading.Event()
+        pending = [len(per_chassis_ports)]
+        times = {}
+
+        def start(chassis, chassis_ports):
+            with lock:
+                pending[0] -= 1
+                if not pending[0]:
+                    go.set()
+            go.wait()
+            sent = monotonic()
+            chassis._send_traffic_command('on', *chassis_ports)
+            times[chassis] = (sent, monotonic())
+
+        run_parallel(start, per_chassis_ports.items())
+
+        first_start = min((sent + acknowledged) / 2 for sent, acknowledged in times.values())
+        traffic_start = XenaObjectsDict()
+        for chassis in per_chassis_ports:
+            sent, acknowledged = times[chassis]
+            traffic_start[chassis] = XenaTrafficStart(sent, acknowledged, (sent + acknowledged) / 2 - first_start,
+                                                      (acknowledged - sent) / 2)
+            self.logger.info('Traffic start on {} skew {:.6f} +/- {:.6f} seconds'.
+                             format(chassis, traffic_start[chassis].skew, traffic_start[chassis].uncertainty))
+
+        wait_for_states_many(ports, 'p_traffic', ['on'], 40)
+        if blocking:
+            self.wait_traffic(*ports)
+        return traffic_start
+
+    def run_traffic(self, duration, interval=None, callback=None, time_limit=False, *ports):
+        """ Run traffic for duration and wait until all transmitted traffic is received.
+
+        Stop is scheduled on monotonic clock, relative to the start command acknowledge, so long runs do not drift.
+        After stop, RX counters of the run ports are polled until they do not change anymore instead of sleeping for
+        fixed time.
+
+        :param duration: run duration in seconds.
+        :param interval: interval in seconds between callback calls.
+        :param callback: function called every interval with (session, seconds since start), until (not including)
+            the end of the run. None - no callback.
+        :param time_limit: True - ports stop by themselves using P_TXTIMELIMIT, False - stop with stop traffic command.
+        :param ports: list of ports to run traffic on. Default - all session ports.
+        :return: run results.
+        :rtype: xenavalkyrie.xena_app.XenaRun
+        """
+
+        ports = list(self._get_operation_ports(*ports))
+        if time_limit:
+            self.api.send_command_batch([(p, 'p_txtimelimit', int(duration * 1000000)) for p in ports])
+
+        for chassis, chassis_ports in self._per_chassis_ports(*ports).items():
+            chassis._send_traffic_command('on', *chassis_ports)
+        start = monotonic()
+        wait_for_states_many(ports, 'p_traffic', ['on'], 40)
+
+        deadline = start + duration
+        calls = 1
+        next_call = start + interval if callback and interval and interval < duration else None
+        while True:
+            now = monotonic()
+            if next_call and next_call <= now:
+                callback(self, now - start)
+                # Skip missed calls so slow callbacks do not accumulate delay, no calls at or after the deadline.
+                while next_call <= monotonic():
+                    calls += 1
+                    next_call = start + calls * interval
+                if calls * interval >= duration:
+                    next_call = None
+                continue
+            if now >= deadline:
+                break
+            time.sleep(min(next_call, deadline) - now if next_call else deadline - now)
+
+        if time_limit:
+            self.wait_traffic(*ports)
+            self.api.send_command_batch([(p, 'p_txtimelimit', 0) for p in ports])
+        else:
+            self.stop_traffic(*ports)
+        stop = monotonic()
+
+        settle = self._wait_settle(ports)
+        durations = XenaObjectsDict()
+        for port, tx_time in zip(ports, self.api.get_attribute_batch([(p, 'p_txtime') for p in ports])):
+            durations[port] = int(tx_time) / 1000000.0
+        self.logger.info('Traffic run {:.6f} seconds, settled after {:.3f} seconds'.format(stop - start, settle))
+        return XenaRun(durations, stop - start, settle)
+
+    def wait_traffic(self, *ports):
+        """ Wait until traffic stops on list of ports.
+
+        :param ports: list of ports to wait for. Default - all session ports.
+        """
+
+        wait_for_states_many(self._get_operation_ports(*ports), 'p_traffic', ['off'], int(2.628e+6))
 
     def stop_traffic(self, *ports):
         """ Stop traffic on list of ports.
@@ -146,8 +285,20 @@ class XenaSession(XenaObject):
         :param ports: list of ports to stop traffic on. Default - all session ports.
         """
 
-        for chassis, chassis_ports in self._per_chassis_ports(*self._get_operation_ports(*ports)).items():
-            chassis.stop_traffic(*chassis_ports)
+        ports = self._get_operation_ports(*ports)
+        for chassis, chassis_ports in self._per_chassis_ports(*ports).items():
+            chassis._send_traffic_command('off', *chassis_ports)
+        wait_for_states_many(ports, 'p_traffic', ['off'], 40)
+
+    def wait_for_up(self, timeout=40, *ports):
+        """ Wait until list of ports are in sync.
+
+        :param timeout: timeout in seconds.
+        :param ports: list of ports to wait for. Default - all session ports.
+        :return: dictionary {port: elapsed time in seconds until the port reached sync}.
+        """
+
+        return wait_for_states_many(self._get_operation_ports(*ports), 'p_receivesync', ['IN_SYNC'], timeout)
 
     def clear_stats(self, *ports):
         """ Clear stats (TX and RX) for list of ports.
@@ -155,8 +306,7 @@ class XenaSession(XenaObject):
         :param ports: list of ports to clear stats on. Default - all session ports.
         """
 
-        for port in self._get_operation_ports(*ports):
-            port.clear_stats()
+        self._fan_out(lambda port: port.clear_stats(), *self._get_operation_ports(*ports))
 
     def start_capture(self, *ports):
         """ Start capture on list of ports.
@@ -164,8 +314,7 @@ class XenaSession(XenaObject):
         :param ports: list of ports to start capture on. Default - all session ports.
         """
 
-        for port in self._get_operation_ports(*ports):
-            port.start_capture()
+        self._fan_out(lambda port: port.start_capture(), *self._get_operation_ports(*ports))
 
     def stop_capture(self, *ports):
         """ Stop capture on list of ports.
@@ -173,8 +322,7 @@ class XenaSession(XenaObject):
         :param ports: list of ports to stop capture on. Default - all session ports.
         """
 
-        for port in self._get_operation_ports(*ports):
-            port.stop_capture()
+        self._fan_out(lambda port: port.stop_capture(), *self._get_operation_ports(*ports))
 
     #
     # Properties.
@@ -206,15 +354,60 @@ class XenaSession(XenaObject):
     def _get_operation_ports(self, *ports):
         return ports if ports else self.ports.values()
 
+    def _reserve_ports(self, ports, force, reset):
+        self.taken_ports = reserve_objects(ports, force)
+        if reset:
+            for port in ports:
+                port._clear_objects()
+            self.api.send_command_batch([(p, 'p_reset') for p in ports])
+
+    def _wait_settle(self, ports):
+        """ Wait until RX bytes and packets counters of all ports do not change between two polls.
+
+        :return: time in seconds until the counters settled.
+        """
+
+        start = monotonic()
+        last_counters = None
+        while True:
+            counters = [c[2:4] for c in self.api.get_stats_batch([(p, 'pr_total') for p in ports])]
+            elapsed = monotonic() - start
+            if counters == last_counters:
+                return elapsed
+            if elapsed >= self.settle_timeout:
+                self.logger.warning('RX counters did not settle after {} seconds'.format(self.settle_timeout))
+                return elapsed
+            last_counters = counters
+            time.sleep(self.settle_interval)
+
     def _per_chassis_ports(self, *ports):
-        per_chassis_ports = {}
+        per_chassis_ports = OrderedDict()
         for port in ports:
-            chassis = self.get_object_by_name(port.name.split('/')[0])
-            if chassis not in per_chassis_ports:
-                per_chassis_ports[chassis] = []
-            per_chassis_ports[chassis].append(port)
+            per_chassis_ports.setdefault(port.chassis, []).append(port)
         return per_chassis_ports
 
+    def _fan_out(self, function, *ports):
+        """ Run function on each port - ports of the same chassis in order, different chassis in parallel.
+
+        :param function: function to run with port as single argument.
+        :param ports: list of ports.
+        :raises TgnError: if the function failed on any port, listing all failed ports.
+        """
+
+        errors = []
+
+        def run_chassis(_, chassis_ports):
+            for port in chassis_ports:
+                try:
+                    function(port)
+                except Exception as e:
+                    errors.append((port, e))
+
+        run_parallel(run_chassis, self._per_chassis_ports(*ports).items())
+        if errors:
+            raise TgnError('Operation failed on {} ports - {}'.
+                           format(len(errors), ', '.join('{}: {}'.format(p, repr(e)) for p, e in errors)))
+
 
 class XenaChassis(XenaObject):
     """ Represents single Xena chassis. """
@@ -222,6 +415,7 @@ class XenaChassis(XenaObject):
     cli_prefix = 'c'
 
     _info_config_commands = ['c_info', 'c_config']
+    _config_command = 'c_config'
     stats_captions = ['ses', 'typ', 'adr', 'own', 'ops', 'req', 'rsp']
 
     def __init__(self, parent, ip, port=22611, password='xena'):
@@ -303,11 +497,7 @@ class XenaChassis(XenaObject):
         :return: ports dictionary (index: object)
         """
 
-        for location in locations:
-            port = XenaPort(parent=self, index=location)
-            port.reserve(force)
-            if reset:
-                port.reset()
+        self.parent._reserve_ports([XenaPort(parent=self, index=location) for location in locations], force, reset)
 
         return self.ports
 
@@ -334,11 +524,10 @@ class XenaChassis(XenaObject):
     def wait_traffic(self, *ports):
         """ Wait until traffic stops on ports.
 
-        :param ports: list of ports to wait for.
+        :param ports: list of ports to wait for. Default - no ports (returns immediately).
         """
 
-        for port in ports:
-            port.wait_for_states('p_traffic', int(2.628e+6), 'off')
+        wait_for_states_many(ports, 'p_traffic', ['off'], int(2.628e+6))
 
     def stop_traffic(self, *ports):
         """ Stop traffic on list of ports.
@@ -360,13 +549,14 @@ class XenaChassis(XenaObject):
         :param config_file_name: full path to the configuration file.
         """
 
-        with open(config_file_name, 'w+') as f:
-            f.write(';Chassis: {}\n'.format(self.name))
-            for line in self.send_command_return_multilines('c_config', '?'):
-                f.write(line.lstrip())
-
+        objects = [self]
         for module in self.modules.values():
-            module.save_config(config_file_name, 'a+')
+            objects.append(module)
+            objects.extend(module.ports.values())
+        save_objects_config(objects, config_file_name)
+
+    def _build_config(self, lines):
+        return ';Chassis: {}\n'.format(self.name) + ''.join(l.lstrip() for l in lines)
 
     #
     # Properties.
@@ -396,10 +586,12 @@ class XenaChassis(XenaObject):
 
     def _traffic_command(self, command, *ports):
         ports = self._get_operation_ports(*ports)
-        ports_str = ' '.join([p.index.replace('/', ' ') for p in ports])
+        self._send_traffic_command(command, *ports)
+        wait_for_states_many(ports, 'p_traffic', [command], 40)
+
+    def _send_traffic_command(self, command, *ports):
+        ports_str = ' '.join([p.index.replace('/', ' ') for p in self._get_operation_ports(*ports)])
         self.send_command('c_traffic', command, ports_str)
-        for port in ports:
-            port.wait_for_states('p_traffic', 40, command)
 
     def _get_operation_ports(self, *ports):
         return ports if ports else self.ports.values()
@@ -411,6 +603,7 @@ class XenaModule(XenaObject):
     cli_prefix = 'm'
 
     _info_config_commands = ['m_info', 'm_config', 'm_portcount']
+    _config_command = 'm_config'
 
     def __init__(self, parent, index):
         """
@@ -440,13 +633,10 @@ class XenaModule(XenaObject):
         :param file_mode: w+ for module configuration file, a+ for chassis configuration.
         """
 
-        with open(config_file_name, file_mode) as f:
-            f.write(';Module: {}\n'.format(self.index))
-            for line in self.send_command_return_multilines('m_config', '?'):
-                f.write(line.split(' ', 1)[1].lstrip())
+        save_objects_config([self] + list(self.ports.values()), config_file_name, file_mode)
 
-        for port in self.ports.values():
-            port.save_config(config_file_name, 'a+')
+    def _build_config(self, lines):
+        return ';Module: {}\n'.format(self.index) + ''.join(l.split(' ', 1)[1].lstrip() for l in lines)
 
     #
     # Properties.
@@ -0,0 +1,159 @@
+"""
+Classes and utilities to compile and cache Xena configuration (xpc) files.
+
+Configuration file is compiled into immutable list of commands plus fingerprint (hash of the normalized commands).
+Compiled configurations are memoized in memory and in small on-disk cache with LRU eviction so the same file is parsed
+only once across sessions. The cache is used only when loads are requested to be skipped (XenaPort.load_config
+skip_if_loaded), its directory is XENAVALKYRIE_CACHE_DIR environment variable or ~/.xenavalkyrie and disk errors are
+logged and ignored - the cache is optimization only.
+
+To skip redundant loads the cache also records, per chassis serial number and port index, the fingerprint of the last
+configuration loaded to the port and the digest of the port full configuration right after the load. If the port still
+carries the same full configuration digest the port was not modified since the load and there is no need to re-load.
+
+:author: yoram@ignissoft.com
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+XenaConfig = namedtuple('XenaConfig', ['commands', 'fingerprint'])
+""" Compiled configuration - tuple of commands and fingerprint of the normalized commands. """
+
+
+def compile_config(lines):
+    """ Compile configuration lines into configuration model.
+
+    :param lines: configuration file lines.
+    :return: compiled configuration.
+    :rtype: xenavalkyrie.xena_config.XenaConfig
+    """
+
+    commands = tuple(l.strip() for l in lines if l.strip() and not l.strip().startswith(';'))
+    return XenaConfig(commands, _digest(commands))
+
+
+class XenaConfigCache(object):
+    """ Memory and disk cache of compiled configurations and of configurations loaded to ports. """
+
+    def __init__(self, cache_dir=None, max_entries=64):
+        """
+        :param cache_dir: cache directory. If None - XENAVALKYRIE_CACHE_DIR environment variable or ~/.xenavalkyrie.
+        :param max_entries: maximum number of compiled configurations to keep (in memory and on disk).
+        """
+
+        self.cache_dir = (cache_dir or os.environ.get('XENAVALKYRIE_CACHE_DIR') or
+                          os.path.join(os.path.expanduser('~'), '.xenavalkyrie'))
+        self.max_entries = max_entries
+        self.configs = OrderedDict()
+        self.serials = {}
+
+    def compile(self, config_file_name):
+        """ Get compiled configuration of configuration file.
+
+        :param config_file_name: full path to the configuration file.
+        :return: compiled configuration.
+        :rtype: xenavalkyrie.xena_config.XenaConfig
+        """
+
+        stat = os.stat(config_file_name)
+        key = _digest([os.path.abspath(config_file_name), str(stat.st_mtime), str(stat.st_size)])
+
+        if key in self.configs:
+            config = self.configs.pop(key)
+            self.configs[key] = config
+            return config
+
+        entry_file_name = os.path.join(self.cache_dir, 'xpc', key + '.json')
+        try:
+            with open(entry_file_name) as f:
+                entry = json.load(f)
+            config = XenaConfig(tuple(entry['commands']), entry['fingerprint'])
+            os.utime(entry_file_name, None)
+        except (IOError, OSError, ValueError, KeyError):
+            with open(config_file_name) as f:
+                config = compile_config(f.read().splitlines())
+            try:
+                self._write_entry(entry_file_name, config)
+            except (IOError, OSError) as e:
+                logger.warning('Failed to write configuration cache entry - {}'.format(e))
+
+        self.configs[key] = config
+        while len(self.configs) > self.max_entries:
+            self.configs.popitem(last=False)
+        return config
+
+    def is_loaded(self, port, config):
+        """
+        :param port: port to test.
+        :param config: compiled configuration.
+        :return: True if the configuration was loaded to the port and the port was not modified since, else False.
+        """
+
+        record = self._read_ports().get(self._port_key(port))
+        return (record is not None and record['fingerprint'] == config.fingerprint and
+                record['digest'] == self._port_digest(port))
+
+    def set_loaded(self, port, config):
+        """ Record that configuration was loaded to port.
+
+        :param port: port the configuration was loaded to.
+        :param config: compiled configuration.
+        """
+
+        ports = self._read_ports()
+        ports[self._port_key(port)] = {'fingerprint': config.fingerprint, 'digest': self._port_digest(port)}
+        try:
+            self._write_json(os.path.join(self.cache_dir, 'ports.json'), ports)
+        except (IOError, OSError) as e:
+            logger.warning('Failed to write loaded configurations cache - {}'.format(e))
+
+    #
+    # Private methods.
+    #
+
+    def _port_key(self, port):
+        if port.chassis not in self.serials:
+            self.serials[port.chassis] = port.chassis.get_attribute('c_serialno')
+        return '{}/{}'.format(self.serials[port.chassis], port.index)
+
+    def _port_digest(self, port):
+        return _digest(l.strip() for l in port.send_command_return_multilines('p_fullconfig', '?'))
+
+    def _read_ports(self):
+        try:
+            with open(os.path.join(self.cache_dir, 'ports.json')) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_entry(self, entry_file_name, config):
+        self._write_json(entry_file_name, {'commands': config.commands, 'fingerprint': config.fingerprint})
+        entries_dir = os.path.dirname(entry_file_name)
+        entries = sorted((os.path.join(entries_dir, e) for e in os.listdir(entries_dir)), key=os.path.getmtime)
+        for entry in entries[:-self.max_entries]:
+            os.remove(entry)
+
+    def _write_json(self, file_name, data):
+        if not os.path.exists(os.path.dirname(file_name)):
+            os.makedirs(os.path.dirname(file_name))
+        # Write to temporary file and rename so concurrent sessions never read partial file.
+        with open(file_name + '.tmp', 'w') as f:
+            json.dump(data, f)
+        if os.name == 'nt' and os.path.exists(file_name):
+            os.remove(file_name)
+        os.rename(file_name + '.tmp', file_name)
+
+
+def _digest(lines):
+    normalized = (' '.join(l.split()) for l in lines)
+    return hashlib.sha1('\n'.join(normalized).encode('utf-8')).hexdigest()
+
+
+config_cache = XenaConfigCache()
+""" Default configurations cache. """
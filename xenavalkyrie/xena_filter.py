@@ -27,6 +27,7 @@ class XenaFilter(XenaObject21):
         """
 
         super(self.__class__, self).__init__(objType='filter', index=index, parent=parent, name=name)
+        self.config = None
 
     def del_object_from_parent(self):
         self.set_state(XenaFilterState.off)
@@ -54,6 +55,7 @@ class XenaMatch(XenaObject21):
         """
 
         super(self.__class__, self).__init__(objType='match', index=index, parent=parent)
+        self.config = None
 
     def del_object_from_parent(self):
         self.send_command('pm_delete')
@@ -72,6 +74,7 @@ class XenaLength(XenaObject21):
         """
 
         super(self.__class__, self).__init__(objType='length', index=index, parent=parent)
+        self.config = None
 
     def del_object_from_parent(self):
         self.send_command('pl_delete')
@@ -0,0 +1,206 @@
+"""
+Classes and utilities to generate packet headers for many streams from single headers template.
+
+The template headers are serialized once, variable fields (MAC, IP, VLAN, L4 ports or any raw bytes field) are declared
+on the template and the headers of all streams are generated with NumPy operations on [streams, header bytes] array.
+
+IPv4 header checksum is recalculated for each generated header. L4 checksums are not recalculated as the payload is
+added by the chassis.
+
+:author: yoram@ignissoft.com
+"""
+
+import socket
+import binascii
+import logging
+
+import numpy
+
+from xenavalkyrie.xena_stream import get_headers_protocol
+
+logger = logging.getLogger(__name__)
+
+
+class XenaHeadersTemplate(object):
+    """ Packet headers template.
+
+    Usage example - 4000 streams with incrementing destination IP and random source port::
+
+        template = XenaHeadersTemplate(Ethernet() + IP() + UDP())
+        template.set_field('dst_ip', start='10.0.0.1')
+        template.set_field('src_port', values=numpy.random.randint(1024, 65535, 4000))
+        port.add_streams([{'attributes': a} for a in template.attributes(4000)])
+    """
+
+    # {field name: {layer name: (offset in layer, width)}}
+    fields_offsets = {'dst_mac': {'ethernet': (0, 6)},
+                      'src_mac': {'ethernet': (6, 6)},
+                      'src_ip': {'ip': (12, 4), 'ip6': (8, 16)},
+                      'dst_ip': {'ip': (16, 4), 'ip6': (24, 16)},
+                      'src_port': {'udp': (0, 2), 'tcp': (0, 2)},
+                      'dst_port': {'udp': (2, 2), 'tcp': (2, 2)}}
+
+    def __init__(self, headers):
+        """
+        :param headers: template packet headers.
+        :type headers: pypacker.layer12.ethernet.Ethernet
+        """
+
+        self.template = numpy.frombuffer(headers.bin(), dtype=numpy.uint8)
+        try:
+            self.ps_headerprotocol = get_headers_protocol(headers)
+        except KeyError as e:
+            logger.warning('pypacker header {} not in conversion list'.format(e.args[0]))
+            self.ps_headerprotocol = None
+
+        # {layer name: offset in headers} of the first layer of each type.
+        self.layers = {}
+        offset = 0
+        body_handler = headers
+        while body_handler:
+            self.layers.setdefault(type(body_handler).__name__.lower(), offset)
+            offset += body_handler.header_len
+            body_handler = body_handler.body_handler
+        self.vlans = len(headers.vlan) if headers.vlan else 0
+        self.ip_header_len = headers.ip.header_len if 'ip' in self.layers else 0
+
+        self.fields = []
+
+    def set_field(self, field, values=None, start=None, step=1, mask=None):
+        """ Declare variable field.
+
+        :param field: field name (see fields_offsets keys), 'vlan_id[N]' for VLAN tag N (0 based) ID or
+            (offset, width) tuple for raw bytes field.
+        :param values: sequence of per stream values (integers or addresses strings), single value for all streams
+            or at least as many values as the number of generated headers.
+        :param start: if values is None - value (integer or address string) of the first stream, the following
+            streams increment by step (in the lower 8 bytes of the field, modulo the field width).
+        :param step: increment step for start, negative step decrements.
+        :param mask: only bits set in mask (integer) are taken from the values, other bits are taken from the
+            template. If None - all bits.
+        """
+
+        offset, width = self._field_offset(field)
+        if not isinstance(field, tuple) and field.startswith('vlan_id') and mask is None:
+            mask = 0x0fff
+        mask_bytes = _to_bytes_array([mask], width)[0] if mask is not None else None
+        if values is not None:
+            self.fields.append((offset, width, mask_bytes, _to_bytes_array(values, width), None))
+        else:
+            self.fields.append((offset, width, mask_bytes, _to_bytes_array([start], width)[0], step))
+
+    def generate(self, count):
+        """ Generate packet headers.
+
+        :param count: number of headers to generate.
+        :return: generated headers as [count, header length] array.
+        :rtype: numpy.ndarray
+        """
+
+        headers = numpy.tile(self.template, (count, 1))
+        for offset, width, mask_bytes, data, step in self.fields:
+            if step is None:
+                if 1 < len(data) < count:
+                    raise ValueError('Field has {} values, expected 1 or at least {}'.format(len(data), count))
+                field_data = data[:count]
+            else:
+                field_data = numpy.tile(data, (count, 1))
+                low_width = min(width, 8)
+                # uint64 arithmetic wraps modulo 2**64 and only the low field bytes are taken, so the result is
+                # (start + i * step) modulo the field width also for negative steps.
+                low = _to_uint64(data[width - low_width:]) + numpy.arange(count, dtype=numpy.uint64) * \
+                    numpy.uint64(step % (1 << 64))
+                field_data[:, width - low_width:] = _int_array_to_bytes(low, low_width)
+            if mask_bytes is None:
+                headers[:, offset:offset + width] = field_data
+            else:
+                headers[:, offset:offset + width] &= ~mask_bytes
+                headers[:, offset:offset + width] |= field_data & mask_bytes
+        if self.ip_header_len:
+            self._fix_ip_checksum(headers)
+        return headers
+
+    def headers(self, count):
+        """ Generate packet headers.
+
+        :param count: number of headers to generate.
+        :return: list of ps_packetheader values.
+        :rtype: list(str)
+        """
+
+        headers_len = 2 * len(self.template)
+        hex_headers = binascii.hexlify(self.generate(count).tobytes()).decode('utf-8')
+        return ['0x' + hex_headers[i:i + headers_len] for i in range(0, count * headers_len, headers_len)]
+
+    def attributes(self, count):
+        """ Generate packet headers stream attributes.
+
+        Returned attributes can be passed as streams specifications attributes to XenaPort.add_streams.
+
+        :param count: number of headers to generate.
+        :return: list of dictionaries {ps_packetheader: value, ps_headerprotocol: value}.
+        """
+
+        if self.ps_headerprotocol:
+            return [{'ps_packetheader': h, 'ps_headerprotocol': self.ps_headerprotocol} for h in self.headers(count)]
+        return [{'ps_packetheader': h} for h in self.headers(count)]
+
+    #
+    # Private methods.
+    #
+
+    def _field_offset(self, field):
+        if isinstance(field, tuple):
+            return field
+        if field.startswith('vlan_id'):
+            vlan = int(field[len('vlan_id'):].strip('[]') or 0)
+            if vlan >= self.vlans:
+                raise ValueError('Template has only {} VLAN tags'.format(self.vlans))
+            return 14 + 4 * vlan, 2
+        for layer, (offset, width) in self.fields_offsets[field].items():
+            if layer in self.layers:
+                return self.layers[layer] + offset, width
+        raise ValueError('Template has no layer for field {}'.format(field))
+
+    def _fix_ip_checksum(self, headers):
+        offset = self.layers['ip']
+        ip_headers = headers[:, offset:offset + self.ip_header_len].astype(numpy.uint32)
+        ip_headers[:, 10:12] = 0
+        checksum = ((ip_headers[:, 0::2] << 8) | ip_headers[:, 1::2]).sum(axis=1)
+        checksum = (checksum & 0xffff) + (checksum >> 16)
+        checksum = ~((checksum & 0xffff) + (checksum >> 16)) & 0xffff
+        headers[:, offset + 10] = checksum >> 8
+        headers[:, offset + 11] = checksum & 0xff
+
+
+def _to_bytes_array(values, width):
+    """ Convert values to [len(values), width] bytes array.
+
+    :param values: integers or addresses strings (MAC, IPv4, IPv6).
+    :param width: field width in bytes.
+    """
+
+    if isinstance(values, numpy.ndarray) and values.dtype.kind in 'iu' and width <= 8:
+        return _int_array_to_bytes(values.astype(numpy.uint64), width)
+    return numpy.frombuffer(b''.join(_to_bytes(v, width) for v in values), dtype=numpy.uint8).reshape(-1, width)
+
+
+def _to_bytes(value, width):
+    if isinstance(value, str) or type(value).__name__ == 'unicode':
+        if width == 6:
+            return binascii.unhexlify(value.replace(':', '').replace('-', ''))
+        if width == 16:
+            return socket.inet_pton(socket.AF_INET6, value)
+        if width == 4:
+            return socket.inet_aton(value)
+        raise ValueError('Address {} for {} bytes field, expected MAC (6), IPv4 (4) or IPv6 (16)'.format(value, width))
+    return binascii.unhexlify('{:0{}x}'.format(int(value) & ((1 << 8 * width) - 1), 2 * width))
+
+
+def _to_uint64(data):
+    return numpy.uint64(int(binascii.hexlify(data.tobytes()), 16))
+
+
+def _int_array_to_bytes(values, width):
+    shifts = numpy.arange(8 * (width - 1), -1, -8, dtype=numpy.uint64)
+    return ((values[:, None] >> shifts) & numpy.uint64(0xff)).astype(numpy.uint8)
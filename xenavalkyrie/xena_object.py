@@ -7,18 +7,41 @@ Base classes and utilities for all Xena Manager (Xena) objects.
 import time
 import re
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 
 from trafficgenerator.tgn_utils import TgnError
 from trafficgenerator.tgn_object import TgnObject, TgnObjectsDict
 
 logger = logging.getLogger(__name__)
 
+# time.monotonic is not available in Python 2.
+monotonic = getattr(time, 'monotonic', time.time)
+
+XenaWaitStats = namedtuple('XenaWaitStats', ['attribute', 'state', 'polls', 'elapsed'])
+""" Statistics of single wait for states - last state read, number of polls and elapsed time in seconds. """
+
 
 class XenaAttributeError(TgnError):
     pass
 
 
+def save_objects_config(objects, config_file_name, file_mode='w+'):
+    """ Save configuration of list of chassis/modules/ports into single configuration file.
+
+    All configuration queries are sent as one batch and the file is written once, in the order of the objects list.
+
+    :param objects: list of chassis/modules/ports to save.
+    :param config_file_name: full path to the configuration file.
+    :param file_mode: w+ for new configuration file, a+ to append to existing configuration file.
+    """
+
+    if not objects:
+        return
+    replies = objects[0].api.send_command_return_multilines_batch([(o, o._config_command, '?') for o in objects])
+    with open(config_file_name, file_mode) as f:
+        f.write(''.join(o._build_config(lines) for o, lines in zip(objects, replies)))
+
+
 class XenaObjectsDict(TgnObjectsDict):
 
     def __getitem__(self, key):
@@ -34,6 +57,16 @@ class XenaObjectsDict(TgnObjectsDict):
 class XenaObject(TgnObject):
     """ Base class for all Xena objects. """
 
+    wait_interval = 0.01
+    """ Initial polling interval, in seconds, of wait_for_states. """
+    wait_backoff = 2
+    """ Polling interval multiplier of wait_for_states. """
+    wait_max_interval = 1
+    """ Maximum polling interval, in seconds, of wait_for_states. """
+
+    wait_stats = None
+    """ Statistics of the last wait_for_states. """
+
     def __init__(self, **data):
         if data['parent']:
             self.session = data['parent'].session
@@ -147,12 +180,34 @@ class XenaObject(TgnObject):
         return self.api.get_attributes(self)
 
     def wait_for_states(self, attribute, timeout=40, *states):
-        for _ in range(timeout):
-            if self.get_attribute(attribute).lower() in [s.lower() for s in states]:
-                return
-            time.sleep(1)
-        raise TgnError('{} failed to reach state {}, state is {} after {} seconds'.
-                       format(attribute, states, self.get_attribute(attribute), timeout))
+        """ Wait until attribute reaches one of the requested states.
+
+        First poll is immediate, then polls interval starts at wait_interval and multiplies by wait_backoff after each
+        poll up to wait_max_interval. Statistics of the last wait are available in wait_stats.
+
+        :param attribute: attribute to poll.
+        :param timeout: timeout in seconds.
+        :param states: requested states (case insensitive).
+        :return: elapsed time in seconds until the attribute reached the requested state.
+        """
+
+        states_l = [s.lower() for s in states]
+        start = monotonic()
+        deadline = start + timeout
+        interval = self.wait_interval
+        polls = 0
+        while True:
+            state = self.get_attribute(attribute)
+            polls += 1
+            now = monotonic()
+            self.wait_stats = XenaWaitStats(attribute, state, polls, now - start)
+            if state.lower() in states_l:
+                return now - start
+            if now >= deadline:
+                raise TgnError('{} failed to reach state {}, state is {} after {} seconds'.
+                               format(attribute, states, state, timeout))
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * self.wait_backoff, self.wait_max_interval)
 
     def read_stat(self, captions, stat_name):
         return dict(zip(captions, self.api.get_stats(self, stat_name)))
@@ -194,3 +249,81 @@ class XenaObject21(XenaObject):
 
     def _get_command_len(self):
         return 1
+
+
+def wait_for_states_many(objects, attribute, states, timeout=40):
+    """ Wait until attribute of all objects reaches one of the requested states.
+
+    Each poll queries all pending objects in one batch and objects are dropped from the pending list as they reach the
+    requested state. Polling intervals are the same as in XenaObject.wait_for_states.
+
+    :param objects: objects to wait for.
+    :param attribute: attribute to poll.
+    :param states: list of requested states (case insensitive).
+    :param timeout: timeout in seconds.
+    :return: dictionary {object: elapsed time in seconds until the object reached the requested state}.
+    """
+
+    elapsed = XenaObjectsDict()
+    pending = list(objects)
+    if not pending:
+        return elapsed
+
+    states_l = [s.lower() for s in states]
+    start = monotonic()
+    deadline = start + timeout
+    interval = XenaObject.wait_interval
+    while True:
+        values = pending[0].api.get_attribute_batch([(o, attribute) for o in pending])
+        now = monotonic()
+        not_reached = []
+        for obj, state in zip(pending, values):
+            if state.lower() in states_l:
+                elapsed[obj] = now - start
+            else:
+                not_reached.append((obj, state))
+        if not not_reached:
+            return elapsed
+        if now >= deadline:
+            not_reached_states = ', '.join('{} is {}'.format(o, s) for o, s in not_reached)
+            raise TgnError('{} failed to reach state {} after {} seconds - {}'.
+                           format(attribute, states, timeout, not_reached_states))
+        pending = [o for o, _ in not_reached]
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * XenaObject.wait_backoff, XenaObject.wait_max_interval)
+
+
+def reserve_objects(objects, force=False):
+    """ Reserve list of objects.
+
+    Reservation state of all objects is queried in one batch and all relinquish and reserve commands are sent in one
+    batch, so objects of different chassis are reserved in parallel.
+
+    :param objects: chassis/modules/ports to reserve.
+    :param force: True - take forcefully, False - fail if any object is reserved by other user.
+    :return: dictionary {object: owner} of objects that were taken from other users.
+    """
+
+    taken = XenaObjectsDict()
+    objects = list(objects)
+    if not objects:
+        return taken
+
+    api = objects[0].api
+    reservations = api.get_attribute_batch([(o, o.cli_prefix + '_reservation') for o in objects])
+    others = [o for o, r in zip(objects, reservations) if r == 'RESERVED_BY_OTHER']
+    if others:
+        owners = api.get_attribute_batch([(o, o.cli_prefix + '_reservedby') for o in others])
+        if not force:
+            raise TgnError('Resources reserved by other users - {}'.
+                           format(', '.join('{} by {}'.format(o, w) for o, w in zip(others, owners))))
+        for obj, owner in zip(others, owners):
+            logger.warning('Taking {} from {}'.format(obj, owner))
+            taken[obj] = owner
+
+    batch = [(o, o.cli_prefix + '_reservation', 'relinquish') for o in others]
+    batch += [(o, o.cli_prefix + '_reservation', 'reserve') for o, r in zip(objects, reservations)
+              if r != 'RESERVED_BY_YOU']
+    if batch:
+        api.send_command_batch(batch)
+    return taken
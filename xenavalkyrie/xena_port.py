@@ -5,13 +5,17 @@ Classes and utilities that represents Xena XenaManager-2G port.
 """
 
 import os
+import re
+import binascii
 from collections import OrderedDict
 from enum import Enum
 
 from xenavalkyrie.api.xena_socket import XenaCommandError
-from xenavalkyrie.xena_object import XenaObject, XenaObject21
-from xenavalkyrie.xena_stream import XenaStream, XenaStreamState
+from xenavalkyrie.xena_object import XenaObject, XenaObject21, save_objects_config
+from xenavalkyrie.xena_config import config_cache, compile_config
+from xenavalkyrie.xena_stream import XenaStream, XenaStreamState, XenaModifier, XenaXModifier
 from xenavalkyrie.xena_filter import XenaFilterState, XenaFilter, XenaMatch, XenaLength
+from xenavalkyrie.xena_statistics_view import XenaStatsPlan
 
 
 class XenaCaptureBufferType(Enum):
@@ -26,6 +30,7 @@ class XenaPort(XenaObject):
     cli_prefix = 'p'
 
     _info_config_commands = ['p_info', 'p_config', 'p_receivesync', 'ps_indices', 'pr_tplds']
+    _config_command = 'p_fullconfig'
 
     stats_captions = {'pr_pfcstats': ['total', 'CoS 0', 'CoS 1', 'CoS 2', 'CoS 3', 'CoS 4', 'CoS 5', 'CoS 6', 'CoS 7'],
                       'pr_total': ['bps', 'pps', 'bytes', 'packets'],
@@ -53,6 +58,7 @@ class XenaPort(XenaObject):
         super(self.__class__, self).__init__(objType='port', index=index, parent=parent, objRef=objRef)
         self._data['name'] = '{}/{}'.format(parent.name, index)
         self.p_info = None
+        self.config = None
 
     def inventory(self):
         self.p_info = self.get_attributes()
@@ -61,31 +67,54 @@ class XenaPort(XenaObject):
         """ Reset port-level parameters to standard values, and delete all streams, filters, capture,
             and dataset definitions.
         """
-        self.objects = OrderedDict()
+        self._clear_objects()
         return self.send_command('p_reset')
 
     def wait_for_up(self, timeout=40):
-        self.wait_for_states('p_receivesync', timeout, 'IN_SYNC')
+        """ Wait until port is in sync.
+
+        :param timeout: timeout in seconds.
+        :return: elapsed time in seconds until the port reached sync.
+        """
+        return self.wait_for_states('p_receivesync', timeout, 'IN_SYNC')
 
     #
     # Configurations.
     #
 
-    def load_config(self, config_file_name):
+    def load_config(self, config_file_name, skip_if_loaded=False, cache=None):
         """ Load configuration file from xpc file.
 
         :param config_file_name: full path to the configuration file.
-        """
-
-        with open(config_file_name) as f:
-            commands = f.read().splitlines()
-
-        for command in commands:
-            if not command.startswith(';'):
-                try:
-                    self.send_command(command)
-                except XenaCommandError as e:
-                    self.logger.warning(str(e))
+        :param skip_if_loaded: True - skip load if the configuration was loaded to the port and the port was not
+            modified since, False - always load. Only when True the configuration cache is used (and written).
+        :param cache: configuration cache to use. If None - xena_config.config_cache.
+        :type cache: xenavalkyrie.xena_config.XenaConfigCache
+        :return: True if the configuration was loaded, False if the load was skipped.
+        """
+
+        cache = cache if cache else config_cache
+        if skip_if_loaded:
+            config = cache.compile(config_file_name)
+            if cache.is_loaded(self, config):
+                self.logger.info('Configuration {} already loaded to port {}'.format(config_file_name, self))
+                return False
+        else:
+            with open(config_file_name) as f:
+                config = compile_config(f.read().splitlines())
+
+        self.config = None
+        for stream in self.get_objects_by_type('stream'):
+            stream.tpld_id = None
+        for command in config.commands:
+            try:
+                self.send_command(command)
+            except XenaCommandError as e:
+                self.logger.warning(str(e))
+
+        if skip_if_loaded:
+            cache.set_loaded(self, config)
+        return True
 
     def save_config(self, config_file_name, file_mode='w+'):
         """ Save configuration file to xpc file.
@@ -94,11 +123,72 @@ class XenaPort(XenaObject):
         :param file_mode: w+ for port configuration file, a+ for module configuration.
         """
 
-        with open(config_file_name, file_mode) as f:
-            f.write(';Port: {}\n'.format(self.index))
-            f.write('P_RESET\n')
-            for line in self.send_command_return_multilines('p_fullconfig', '?'):
-                f.write(line.split(' ', 1)[1].lstrip())
+        save_objects_config([self], config_file_name, file_mode)
+
+    def _build_config(self, lines):
+        return ';Port: {}\nP_RESET\n'.format(self.index) + ''.join(l.split(' ', 1)[1].lstrip() for l in lines)
+
+    def hydrate(self):
+        """ Build all port streams, modifiers, filters, matches and lengthes from single p_fullconfig query.
+
+        Port, streams, filters, matches and lengthes attributes read from the port are available in object.config
+        dictionary {attribute: value}, modifiers values are set as modifier attributes (position, mask etc.).
+        As long as the port is hydrated, streams, filters etc. properties will not re-read the port even if there are
+        no objects.
+
+        :raises XenaCommandError: if the port configuration lists stream modifiers without their configuration.
+        """
+
+        # {(command prefix, (sub index)): {command: value}}, for example {('ps', ('0', '1')): {'ps_modifier': value}}.
+        # Port level commands (including ps_indices, pf_indices etc.) are under ('p', ()).
+        configs = OrderedDict()
+        for line in self.send_command_return_multilines('p_fullconfig', '?'):
+            match = re.match(r'^\S+\s+(\w+)\s*(?:\[([\d,]+)\])?\s*(.*?)\s*$', line)
+            if match:
+                command, index, value = match.groups()
+                key = (command.split('_')[0].lower(), tuple(index.split(','))) if index else ('p', ())
+                if len(value) > 1 and value.startswith('"') and value.endswith('"'):
+                    value = value[1:-1]
+                configs.setdefault(key, {})[command.lower()] = value
+        self.config = configs.get(('p', ()), {})
+
+        for obj in self.get_objects_by_type('stream', 'filter', 'match', 'length'):
+            self.objects.pop(obj.ref)
+
+        modifiers_commands = [(XenaModifier, 'ps_modifiercount', 'ps_modifier', 'ps_modifierrange'),
+                              (XenaXModifier, 'ps_modifierextcount', 'ps_modifierext', 'ps_modifierextrange')]
+        tpld_ids = []
+        for sid in self.config.get('ps_indices', '').split():
+            stream = XenaStream(parent=self, index='{}/{}'.format(self.index, sid), name=None)
+            stream.config = configs.get(('ps', (sid,)), {})
+            if stream.config.get('ps_comment'):
+                stream._data['name'] = stream.config['ps_comment']
+            if stream.config.get('ps_tpldid'):
+                tpld_ids.append(stream.config['ps_tpldid'])
+                stream.tpld_id = int(stream.config['ps_tpldid'])
+            for modifier_class, count_command, modifier_command, range_command in modifiers_commands:
+                for mid in range(int(stream.config.get(count_command, 0))):
+                    modifier = modifier_class(stream, index='{}/{}'.format(stream.index, mid))
+                    modifier_config = configs.get(('ps', (sid, str(mid))), {})
+                    if modifier_command not in modifier_config:
+                        raise XenaCommandError('Stream {} {} is {} but {} [{},{}] is missing'.
+                                               format(stream.index, count_command, stream.config[count_command],
+                                                      modifier_command, sid, mid))
+                    modifier._parse_modifier(modifier_config[modifier_command])
+                    if range_command in modifier_config:
+                        modifier._parse_range(modifier_config[range_command])
+        if tpld_ids:
+            XenaStream.next_tpld_id = max([XenaStream.next_tpld_id] + [int(t) for t in tpld_ids]) + 1
+
+        for fid in self.config.get('pf_indices', '').split():
+            filter = XenaFilter(parent=self, index='{}/{}'.format(self.index, fid), name=None)
+            filter.config = configs.get(('pf', (fid,)), {})
+            if filter.config.get('pf_comment'):
+                filter._data['name'] = filter.config['pf_comment']
+        for mid in self.config.get('pm_indices', '').split():
+            XenaMatch(parent=self, index='{}/{}'.format(self.index, mid)).config = configs.get(('pm', (mid,)), {})
+        for lid in self.config.get('pl_indices', '').split():
+            XenaLength(parent=self, index='{}/{}'.format(self.index, lid)).config = configs.get(('pl', (lid,)), {})
 
     def add_stream(self, name=None, tpld_id=None, state=XenaStreamState.enabled):
         """ Add stream.
@@ -119,6 +209,63 @@ class XenaPort(XenaObject):
         stream.set_state(state)
         return stream
 
+    def add_streams(self, streams, state=XenaStreamState.enabled):
+        """ Add multiple streams.
+
+        Streams indices and TPLD IDs are allocated locally and all streams are created and configured in one batch.
+
+        :param streams: number of streams to add or list of streams specifications. Stream specification is dictionary
+            with optional keys - name, tpld_id, state, headers (pypacker.layer12.ethernet.Ethernet) and attributes
+            (dictionary {attribute: value} of additional stream attributes, like ps_rateppm or ps_packetlimit).
+        :param state: state for streams with no state in specification.
+        :type state: xenavalkyrie.xena_stream.XenaStreamState
+        :return: list of newly created streams.
+        :rtype: list of xenavalkyrie.xena_stream.XenaStream
+        """
+
+        specs = [{}] * streams if isinstance(streams, int) else streams
+        current_streams = self.streams
+        next_index = max(current_streams) + 1 if current_streams else 0
+
+        new_streams = []
+        batch = []
+        for index, spec in enumerate(specs, start=next_index):
+            stream_index = '{}/{}'.format(self.index, index)
+            stream = XenaStream(parent=self, index=stream_index, name=spec.get('name', stream_index))
+            tpld_id = spec['tpld_id'] if spec.get('tpld_id') is not None else XenaStream.next_tpld_id
+            XenaStream.next_tpld_id = max(XenaStream.next_tpld_id + 1, tpld_id + 1)
+            batch.append((stream, stream.create_command))
+            batch.append((stream, 'ps_comment', '"{}"'.format(stream.name)))
+            batch.append((stream, 'ps_tpldid', tpld_id))
+            if spec.get('headers'):
+                ps_packetheader, ps_headerprotocol = stream._encode_packet_headers(spec['headers'])
+                batch.append((stream, 'ps_packetheader', ps_packetheader))
+                if ps_headerprotocol:
+                    batch.append((stream, 'ps_headerprotocol', ps_headerprotocol))
+            for attribute, value in spec.get('attributes', {}).items():
+                batch.append((stream, attribute, value))
+            stream.tpld_id = int(spec.get('attributes', {}).get('ps_tpldid', tpld_id))
+            batch.append((stream, 'ps_enable', spec.get('state', state).value))
+            new_streams.append(stream)
+
+        self.api.send_command_batch(batch)
+        return new_streams
+
+    def get_packet_headers(self):
+        """ Get packet headers of all streams in one batch.
+
+        Each stream gets its own headers object (see XenaStream.get_packet_headers).
+
+        :return: dictionary {stream id: packet headers}.
+        :rtype: dict of (int, pypacker.layer12.ethernet.Ethernet)
+        """
+
+        streams = self.streams
+        values = self.api.get_attribute_batch([(s, 'ps_packetheader') for s in streams.values()])
+        for stream, value in zip(streams.values(), values):
+            stream.packet_headers_key = value
+        return {i: XenaStream._decode_packet_headers(v) for i, v in zip(streams.keys(), values)}
+
     def remove_stream(self, index):
         """ Remove stream.
 
@@ -241,30 +388,21 @@ class XenaPort(XenaObject):
             Sea XenaPort.stats_captions.
         """
 
-        stats_with_captions = OrderedDict()
-        for stat_name in self.stats_captions.keys():
-            stats_with_captions[stat_name] = self.read_stat(self.stats_captions[stat_name], stat_name)
-        return stats_with_captions
+        return XenaStatsPlan([self]).read()[self]
 
     def read_stream_stats(self):
         """
         :return: dictionary {stream index {stat name: value}}.
             Sea XenaStream.stats_captions.
         """
-        stream_stats = OrderedDict()
-        for stream in self.streams.values():
-            stream_stats[stream] = stream.read_stats()
-        return stream_stats
+        return XenaStatsPlan(self.streams.values()).read()
 
     def read_tpld_stats(self):
         """
         :return: dictionary {tpld index {group name {stat name: value}}}.
             Sea XenaTpld.stats_captions.
         """
-        payloads_stats = OrderedDict()
-        for tpld in self.tplds.values():
-            payloads_stats[tpld] = tpld.read_stats()
-        return payloads_stats
+        return XenaStatsPlan(self.tplds.values()).read()
 
     #
     # Properties.
@@ -277,14 +415,14 @@ class XenaPort(XenaObject):
         :rtype: dict of (int, xenavalkyrie.xena_stream.XenaStream)
         """
 
-        if not self.get_objects_by_type('stream'):
+        if not self.get_objects_by_type('stream') and self.config is None:
             tpld_ids = []
             for index in self.get_attribute('ps_indices').split():
                 stream = XenaStream(parent=self, index='{}/{}'.format(self.index, index), name=None)
                 ps_comment = stream.get_attribute('ps_comment')
                 if ps_comment:
                     stream._data['name'] = ps_comment
-                tpld_ids.append(stream.get_attribute('ps_tpldid'))
+                tpld_ids.append(str(stream.get_tpld_id()))
             if tpld_ids:
                 XenaStream.next_tpld_id = max([XenaStream.next_tpld_id] + [int(t) for t in tpld_ids]) + 1
         return {s.id: s for s in self.get_objects_by_type('stream')}
@@ -297,9 +435,7 @@ class XenaPort(XenaObject):
         """
 
         # As TPLDs are dynamic we must re-read them each time from the port.
-        self.parent.del_objects_by_type('tpld')
-        for tpld in self.get_attribute('pr_tplds').split():
-            XenaTpld(parent=self, index='{}/{}'.format(self.index, tpld))
+        self._update_tplds(self.get_attribute('pr_tplds').split())
         return {t.id: t for t in self.get_objects_by_type('tpld')}
 
     @property
@@ -320,7 +456,7 @@ class XenaPort(XenaObject):
         :rtype: dict of (int, xenavalkyrie.xena_filter.XenaFilter)
         """
 
-        if not self.get_objects_by_type('filter'):
+        if not self.get_objects_by_type('filter') and self.config is None:
             for index in self.get_attribute('pf_indices').split():
                 filter = XenaFilter(parent=self, index='{}/{}'.format(self.index, index), name=None)
                 pf_comment = filter.get_attribute('pf_comment')
@@ -335,7 +471,7 @@ class XenaPort(XenaObject):
         :rtype: dict of (int, xenavalkyrie.xena_filter.XenaMatch)
         """
 
-        if not self.get_objects_by_type('match'):
+        if not self.get_objects_by_type('match') and self.config is None:
             for index in self.get_attribute('pm_indices').split():
                 XenaMatch(parent=self, index='{}/{}'.format(self.index, index))
         return {m.id: m for m in self.get_objects_by_type('match')}
@@ -347,11 +483,35 @@ class XenaPort(XenaObject):
         :rtype: dict of (int, xenavalkyrie.xena_filter.XenaLength)
         """
 
-        if not self.get_objects_by_type('length'):
+        if not self.get_objects_by_type('length') and self.config is None:
             for index in self.get_attribute('pl_indices').split():
                 XenaLength(parent=self, index='{}/{}'.format(self.index, index))
         return {l.id: l for l in self.get_objects_by_type('length')}
 
+    #
+    # Private methods.
+    #
+
+    def _clear_objects(self):
+        """ Forget all port child objects after port reset. """
+        self.objects = OrderedDict()
+        self.config = None
+
+    def _update_tplds(self, tpld_ids):
+        """ Update TPLD children to the current TPLD IDs, existing TPLD objects are kept.
+
+        :param tpld_ids: list of current TPLD IDs as returned by pr_tplds.
+        :return: True if TPLDs were added or removed, else False.
+        """
+        current = {t.id: t for t in self.get_objects_by_type('tpld')}
+        tpld_ids = [int(i) for i in tpld_ids]
+        for tpld_id in set(current) - set(tpld_ids):
+            current[tpld_id].del_object_from_parent()
+        for tpld_id in tpld_ids:
+            if tpld_id not in current:
+                XenaTpld(parent=self, index='{}/{}'.format(self.index, tpld_id))
+        return set(current) != set(tpld_ids)
+
 
 class XenaTpld(XenaObject21):
 
@@ -373,10 +533,7 @@ class XenaTpld(XenaObject21):
             Sea XenaTpld.stats_captions.
         """
 
-        stats_with_captions = OrderedDict()
-        for stat_name in self.stats_captions.keys():
-            stats_with_captions[stat_name] = self.read_stat(self.stats_captions[stat_name], stat_name)
-        return stats_with_captions
+        return XenaStatsPlan([self]).read()[self]
 
 
 class XenaCapture(XenaObject):
@@ -399,7 +556,7 @@ class XenaCapture(XenaObject):
         return self.read_stat(XenaCapture.stats_captions, 'pc_stats')
 
     def get_packets(self, from_index=0, to_index=None, cap_type=XenaCaptureBufferType.text,
-                    file_name=None, tshark=None):
+                    file_name=None, tshark=None, window=1000, callback=None):
         """ Get captured packets from chassis.
 
         :param from_index: index of first packet to read.
@@ -408,14 +565,17 @@ class XenaCapture(XenaObject):
         :param file_name: if specified, capture will be saved in file.
         :param tshark: tshark object for pcap type only.
         :type: xenavalkyrie.xena_tshark.Tshark
+        :param window: number of pc_packet queries to pipeline per round trip.
+        :param callback: see download_packets.
         :return: list of requested packets, None for pcap type.
         """
 
-        to_index = to_index if to_index else len(self.packets)
-
+        to_index = to_index if to_index is not None else self.read_stats()['packets']
         raw_packets = []
-        for index in range(from_index, to_index):
-            raw_packets.append(self.packets[index].get_attribute('pc_packet').split('0x')[1])
+        for hex_packets in self._read_packets(from_index, to_index, window):
+            raw_packets.extend(hex_packets)
+            if callback:
+                callback(raw_packets, to_index)
 
         if cap_type == XenaCaptureBufferType.raw:
             self._save_captue(file_name, raw_packets)
@@ -424,12 +584,9 @@ class XenaCapture(XenaObject):
         text_packets = []
         for raw_packet in raw_packets:
             text_packet = ''
-            for c, b in zip(range(len(raw_packet)), raw_packet):
-                if c % 32 == 0:
-                    text_packet += '\n{:06x} '.format(int(c / 2))
-                elif c % 2 == 0:
-                    text_packet += ' '
-                text_packet += b
+            for c in range(0, len(raw_packet), 32):
+                line = raw_packet[c:c + 32]
+                text_packet += '\n{:06x} {}'.format(c // 2, ' '.join(line[b:b + 2] for b in range(0, len(line), 2)))
             text_packets.append(text_packet)
 
         if cap_type == XenaCaptureBufferType.text:
@@ -441,6 +598,30 @@ class XenaCapture(XenaObject):
         tshark.text_to_pcap(temp_file_name, file_name)
         os.remove(temp_file_name)
 
+    def download_packets(self, from_index=0, to_index=None, window=1000, packets=None, callback=None):
+        """ Download captured packets as bytes.
+
+        pc_packet queries are pipelined in windows of window packets and no packet object is created (use the packets
+        property to get XenaCapturePacket objects).
+
+        :param from_index: index of first packet to read.
+        :param to_index: index of last packet to read. If None - read all packets.
+        :param window: number of pc_packet queries to pipeline per round trip.
+        :param packets: list to append the downloaded packets to. Pass a list to keep the partial results if the
+            download fails.
+        :param callback: function to call after each window with (list of packets downloaded so far, to_index).
+        :return: list of requested packets.
+        :rtype: list(bytes)
+        """
+
+        to_index = to_index if to_index is not None else self.read_stats()['packets']
+        packets = packets if packets is not None else []
+        for hex_packets in self._read_packets(from_index, to_index, window):
+            packets.extend(binascii.unhexlify(p) for p in hex_packets)
+            if callback:
+                callback(packets, to_index)
+        return packets
+
     #
     # Properties.
     #
@@ -461,6 +642,20 @@ class XenaCapture(XenaObject):
     # Private methods.
     #
 
+    def _read_packets(self, from_index, to_index, window):
+        """ Generate lists of hex packets (without 0x), one list per window. """
+
+        for first in range(from_index, to_index, window):
+            indices = range(first, min(first + window, to_index))
+            replies = self.api.send_command_return_batch([(self, 'pc_packet', '[{}]'.format(i), '?') for i in indices])
+            hex_packets = []
+            for index, reply in zip(indices, replies):
+                match = re.match(r'^\[(\d+)\]\s+0x([0-9a-fA-F]*)\s*$', reply)
+                if not match or int(match.group(1)) != index:
+                    raise XenaCommandError('Unexpected pc_packet [{}] reply({})'.format(index, reply))
+                hex_packets.append(match.group(2))
+            yield hex_packets
+
     def _save_captue(self, file_name, packets):
         if file_name:
             with open(file_name, 'w+') as f:
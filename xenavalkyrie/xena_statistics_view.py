@@ -7,23 +7,516 @@ There are three different views - ports, streams and TPLD.
 :author: yoram@ignissoft.com
 """
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
+
+import numpy
 
 from trafficgenerator.tgn_object import TgnSubStatsDict
-from xenavalkyrie.xena_object import XenaObjectsDict
+from xenavalkyrie.api.xena_cli import run_parallel
+from xenavalkyrie.api.xena_socket import XenaCommandError
+from xenavalkyrie.xena_object import XenaObjectsDict, monotonic
+
+
+XenaStatsTime = namedtuple('XenaStatsTime', ['timestamp', 'window', 'skew'])
+""" Statistics collection time of single object - local monotonic timestamp (middle of the collection window), duration
+    of the collection window and skew relative to the earliest timestamp of the same read, all in seconds. """
+
+
+class XenaStatsPlan(object):
+    """ Precompiled statistics collection plan.
+
+    The plan holds the list of all statistics queries of a set of objects (ports, streams, TPLDs, in any mix) and the
+    layout to parse the replies into stats_captions. Each read sends all queries of each chassis as one pipelined
+    burst, all chassis concurrently, and times the collection window of each chassis so the statistics of different
+    objects can be compared (see times). The same plan can be read any number of times.
+
+    The plan can also discover the current TPLDs of ports in the same bursts as the statistics (see discovered).
+
+    Counters selection limits the plan to the statistics groups of the selected counters, so narrow monitoring reads
+    only the groups it needs (each query returns the whole group so tables include all counters of selected groups).
+    """
+
+    # Statistics command of objects with single statistics group (stats_captions is list of captions).
+    stats_commands = {'stream': 'pt_stream', 'capture': 'pc_stats'}
+
+    def __init__(self, objects, discover=(), counters=None):
+        """
+        :param objects: list of objects to read statistics for.
+        :param discover: list of ports to discover TPLDs for.
+        :param counters: list of groups (pr_total) and/or flat counters names (group_caption, like pr_total_packets,
+            or caption, like packets, for objects with single statistics group) to read. If None - all groups.
+            Objects without selected counters are not read at all and names that do not match any object are ignored
+            (TPLDs may be discovered later), use expand_counters to validate names.
+        """
+
+        self.objects = list(objects)
+        self.counters = counters
+        self.batch = []
+        self.layout = []
+        # {chassis: list of positions in batch}
+        self.chassis_positions = OrderedDict()
+        # {object type: (rows, columns, [[(position, width), ...] per row])}
+        self.tables_layout = OrderedDict()
+        for obj in self.objects:
+            groups = stats_groups(obj)
+            if counters is not None:
+                single = not isinstance(obj.stats_captions, dict)
+                groups = OrderedDict((g, c) for g, c in groups.items()
+                                     if g in counters or any(flat_name(None if single else g, caption) in counters
+                                                             for caption in c))
+                if not groups:
+                    continue
+            position = len(self.batch)
+            for group, captions in groups.items():
+                self.chassis_positions.setdefault(obj.chassis, []).append(len(self.batch))
+                self.batch.append((obj, group))
+                self.layout.append((obj, group if isinstance(obj.stats_captions, dict) else None, captions))
+
+            if obj.type not in self.tables_layout:
+                group_names = groups.keys() if isinstance(obj.stats_captions, dict) else [None]
+                columns = [(g, c) for g, captions in zip(group_names, groups.values()) for c in captions]
+                self.tables_layout[obj.type] = ([], columns, [])
+            rows, _, rows_positions = self.tables_layout[obj.type]
+            rows.append(obj)
+            rows_positions.append([(position + i, len(c)) for i, c in enumerate(groups.values())])
+        self.times = XenaObjectsDict()
+
+        # Discovery queries are last so they do not change the statistics positions.
+        self.discover = list(discover)
+        for port in self.discover:
+            self.chassis_positions.setdefault(port.chassis, []).append(len(self.batch))
+            self.batch.append((port, 'pr_tplds'))
+        self.discovered = OrderedDict()
+
+    def expand_counters(self, counters=None):
+        """ Expand groups in counters list into their flat counters names.
+
+        :param counters: list of groups (pr_total) and/or flat counters names (pr_total_packets, packets). If None - the
+            plan counters.
+        :return: list of flat counters names (group_caption, or caption for objects with single statistics group), in
+            counters order, as in XenaStatsTable.flat_columns.
+        :raises ValueError: for names that are not group or counter of any of the plan objects.
+        """
+
+        # {group: flat counters names}
+        groups = OrderedDict()
+        for (_, group), (_, layout_group, captions) in zip(self.batch, self.layout):
+            groups[group] = [flat_name(layout_group, c) for c in captions]
+        flat_counters = [c for names in groups.values() for c in names]
+
+        expanded = []
+        unknown = []
+        for counter in counters if counters is not None else self.counters or groups.keys():
+            if counter in groups:
+                expanded.extend(groups[counter])
+            elif counter in flat_counters:
+                expanded.append(counter)
+            else:
+                unknown.append(counter)
+        if unknown:
+            available = list(OrderedDict((g, None) for o in self.objects for g in stats_groups(o)))
+            raise ValueError('Unknown statistics counters {}, available groups are {}'.format(unknown, available))
+        return expanded
+
+    def read(self):
+        """ Read statistics.
+
+        Collection times of the read are available in times as dictionary {object: XenaStatsTime}.
+
+        :return: dictionary {object: {group name: {stat name: value}}}, or {object: {stat name: value}} for objects
+            with single statistics group (like streams).
+        """
+
+        statistics = XenaObjectsDict()
+        for (obj, group, captions), counters in zip(self.layout, self.read_values()):
+            if group is None:
+                statistics[obj] = OrderedDict(zip(captions, counters))
+            else:
+                if obj not in statistics:
+                    statistics[obj] = OrderedDict()
+                statistics[obj][group] = OrderedDict(zip(captions, counters))
+        return statistics
+
+    def read_tables(self):
+        """ Read statistics into columnar tables.
+
+        :return: dictionary {object type: XenaStatsTable}.
+        :raises XenaCommandError: if some reply has less counters than the statistics group captions.
+        """
+
+        values = self.read_values()
+        for position, (obj, group, captions) in enumerate(self.layout):
+            if len(values[position]) < len(captions):
+                raise XenaCommandError('{} {} returned {} counters, expected {}'.
+                                       format(obj.name, self.batch[position][1], len(values[position]), len(captions)))
+        tables = OrderedDict()
+        for obj_type, (rows, columns, rows_positions) in self.tables_layout.items():
+            data = numpy.array([[v for p, w in positions for v in values[p][:w]]
+                                for positions in rows_positions], dtype=numpy.int64)
+            timestamps = numpy.array([self.times[o].timestamp for o in rows], dtype=numpy.float64)
+            tables[obj_type] = XenaStatsTable(rows, columns, data, timestamps)
+        return tables
+
+    def read_values(self):
+        """ Read statistics without parsing into captions.
+
+        :return: list of counters lists, in the order of the plan batch.
+        """
+
+        self.times = XenaObjectsDict()
+        self.discovered = OrderedDict()
+        if not self.batch:
+            return []
+
+        values = [None] * len(self.batch)
+        windows = {}
+
+        def read_chassis(chassis, positions):
+            batch = [self.batch[p] for p in positions]
+            start = monotonic()
+            counters = chassis.api.get_stats_batch(batch)
+            windows[chassis] = (start, monotonic())
+            for position, position_counters in zip(positions, counters):
+                values[position] = position_counters
+
+        run_parallel(read_chassis, self.chassis_positions.items())
+
+        first = min((start + end) / 2 for start, end in windows.values())
+        for obj in self.objects:
+            if obj.chassis in windows:
+                start, end = windows[obj.chassis]
+                self.times[obj] = XenaStatsTime((start + end) / 2, end - start, (start + end) / 2 - first)
+        for port, tpld_ids in zip(self.discover, values[len(self.layout):]):
+            self.discovered[port] = tpld_ids
+        return values[:len(self.layout)]
+
+
+class XenaStatsTable(Mapping):
+    """ Columnar statistics of objects of the same type.
+
+    Counters are stored as single [rows, columns] integer array, rows are objects and columns are (group, caption)
+    tuples derived from stats_captions (group is None for objects with single statistics group, like streams).
+
+    The table is also read only mapping {object: {group name: {stat name: value}}} (same as the dictionaries returned
+    by XenaStatsPlan.read), where each object dictionary is built only when accessed.
+
+    Subtracting two tables of the same plan (later - earlier) returns XenaStatsDelta.
+    """
+
+    gauge_captions = ('bps', 'pps')
+    """ Captions of columns that are not cumulative counters (delta of such column is the later value). """
+    gauge_groups = ('pr_tpldlatency', 'pr_tpldjitter')
+    """ Groups of columns that are not cumulative counters. """
+    counter_bits = 64
+    """ Counters width. Counters that decrease between reads are assumed to wrap around at 2^counter_bits if narrower
+        than 64 bits, else to be reset (cleared) between the reads. """
+
+    def __init__(self, rows, columns, values, timestamps=None):
+        """
+        :param rows: list of objects.
+        :param columns: list of (group, caption) tuples.
+        :param values: [rows, columns] counters array.
+        :param timestamps: [rows] array of local monotonic collection timestamps.
+        """
+
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self.timestamps = timestamps if timestamps is not None else numpy.zeros(len(rows))
+        self.rows_index = OrderedDict((o, i) for i, o in enumerate(rows))
+        self.columns_index = OrderedDict((c, i) for i, c in enumerate(columns))
+
+    def column(self, group, caption=None):
+        """
+        :param group: group name (statistics command), or caption for tables with single statistics group.
+        :param caption: caption name.
+        :return: [rows] array of column values.
+        """
+
+        key = (group, caption) if caption is not None else (None, group)
+        return self.values[:, self.columns_index[key]]
+
+    def gauges(self):
+        """
+        :return: [columns] boolean array, True for gauge (not cumulative counter) columns.
+        """
+
+        return numpy.array([c in self.gauge_captions or g in self.gauge_groups for g, c in self.columns], dtype=bool)
+
+    def flat_columns(self):
+        """
+        :return: list of flat column names, group_caption (or caption for tables with single statistics group).
+        """
+
+        return [flat_name(g, c) for g, c in self.columns]
+
+    def to_pandas(self):
+        """ Convert to pandas data frame (pandas is optional and imported only here).
+
+        :return: statistics as pandas data frame, rows are indexed by object name and columns by flat column name.
+        :rtype: pandas.DataFrame
+        """
+
+        import pandas
+        return pandas.DataFrame(self.values, index=[o.name for o in self.rows], columns=self.flat_columns())
+
+    def dumps(self, indent=1):
+        """ Returns nested string representation of the table (like json.dumps). """
+        return XenaObjectsDict(self.items()).dumps(indent)
+
+    def __sub__(self, other):
+        """ Vectorized delta between two reads of the same objects.
+
+        Rows are matched by object, columns must be the same in both reads.
+
+        :param other: earlier read.
+        :type other: xenavalkyrie.xena_statistics_view.XenaStatsTable
+        :return: delta of the objects that exist in both reads.
+        :rtype: xenavalkyrie.xena_statistics_view.XenaStatsDelta
+        :raises ValueError: if the tables columns are different.
+        """
+
+        if list(other.columns) != list(self.columns):
+            raise ValueError('Cannot subtract statistics tables with different columns')
+        if other.rows == self.rows:
+            rows, self_rows, other_rows = self.rows, slice(None), slice(None)
+        else:
+            rows = [o for o in self.rows if o in other.rows_index]
+            self_rows = numpy.array([self.rows_index[o] for o in rows], dtype=numpy.intp)
+            other_rows = numpy.array([other.rows_index[o] for o in rows], dtype=numpy.intp)
+        later = self.values[self_rows]
+        earlier = other.values[other_rows]
+
+        # Counters are unsigned, compare and subtract as unsigned so counters above 2^63 get the right delta.
+        later_u = later.astype(numpy.uint64)
+        earlier_u = earlier.astype(numpy.uint64)
+        gauges = self.gauges()
+        decreased = (later_u < earlier_u) & ~gauges
+        deltas = later_u - earlier_u
+        if self.counter_bits < 64:
+            deltas &= numpy.uint64((1 << self.counter_bits) - 1)
+            resets = numpy.zeros(decreased.shape, dtype=bool)
+        else:
+            # 64 bits counter do not wrap in practice, so decreased counter was reset and counted from zero since.
+            deltas = numpy.where(decreased, later_u, deltas)
+            resets = decreased
+        deltas = deltas.astype(numpy.int64)
+        deltas[:, gauges] = later[:, gauges]
+
+        timestamps = self.timestamps[self_rows]
+        return XenaStatsDelta(rows, self.columns, deltas, timestamps, timestamps - other.timestamps[other_rows], resets)
+
+    def __getitem__(self, key):
+        row = self._row(key)
+        values = self.values[row].tolist()
+        if self.columns and self.columns[0][0] is None:
+            return OrderedDict((c, v) for (_, c), v in zip(self.columns, values))
+        stats = OrderedDict()
+        for (group, caption), value in zip(self.columns, values):
+            if group not in stats:
+                stats[group] = OrderedDict()
+            stats[group][caption] = value
+        return stats
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    #
+    # Private methods.
+    #
+
+    def _row(self, key):
+        if key in self.rows_index:
+            return self.rows_index[key]
+        for obj, row in self.rows_index.items():
+            if key in (obj.name, obj.ref, obj.index):
+                return row
+        raise KeyError(key)
+
+
+class XenaStatsDelta(XenaStatsTable):
+    """ Delta between two statistics tables.
+
+    Counter columns hold the counter increments and gauge columns hold the later value.
+    """
+
+    def __init__(self, rows, columns, values, timestamps, intervals, resets=None):
+        """
+        :param intervals: [rows] array of measured intervals, in seconds, between the two reads of each object.
+        :param resets: [rows, columns] boolean array, True for counters that were reset between the two reads (their
+            delta is the value counted since the reset). If None - no resets.
+        """
+
+        super(XenaStatsDelta, self).__init__(rows, columns, values, timestamps)
+        self.intervals = intervals
+        self.resets = resets if resets is not None else numpy.zeros(values.shape, dtype=bool)
+
+    def rates(self):
+        """
+        :return: [rows, columns] array of counters increments per second (gauge columns are left as is).
+        """
+
+        intervals = numpy.where(self.intervals > 0, self.intervals, numpy.inf)
+        return numpy.where(self.gauges(), self.values, self.values / intervals[:, numpy.newaxis])
+
+    def error_ratio(self):
+        """ Payload errors ratio of TPLDs delta.
+
+        :return: [rows] array of (sequence + misordered + payload errors) / received packets.
+        """
+
+        errors = self.column('pr_tplderrors', 'seq') + self.column('pr_tplderrors', 'mis') + \
+            self.column('pr_tplderrors', 'pld')
+        return _ratio(errors, self.column('pr_tpldtraffic', 'pac'))
+
+
+class XenaStatsDict(MutableMapping):
+    """ Dictionary {object: statistics dictionary} whose values are built only when accessed.
+
+    Views read_stats return this dictionary over the statistics tables of the read, so polling does not build per object
+    dictionaries that are never used. Values are built once and then kept, so they can be modified like any dictionary.
+
+    Like XenaObjectsDict, values can be accessed by object, object name, reference or index, and unknown keys return
+    None.
+    """
+
+    def __init__(self, objects, build):
+        """
+        :param objects: list of objects (dictionary keys).
+        :param build: function that gets object and returns its statistics dictionary.
+        """
+
+        self.objects = OrderedDict((o, None) for o in objects)
+        self._build = build
+        self._values = {}
+
+    def get(self, key, default=None):
+        obj = self._object(key)
+        return self[obj] if obj is not None else default
+
+    def dumps(self, indent=1):
+        """ Returns nested string representation of the dictionary (like json.dumps). """
+        return XenaObjectsDict(self.items()).dumps(indent)
+
+    def __getitem__(self, key):
+        obj = self._object(key)
+        if obj is None:
+            return None
+        if obj not in self._values:
+            self._values[obj] = self._build(obj)
+        return self._values[obj]
+
+    def __setitem__(self, key, value):
+        self.objects[key] = None
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        del self.objects[key]
+        self._values.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.objects
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    #
+    # Private methods.
+    #
+
+    def _object(self, key):
+        if key in self.objects:
+            return key
+        for obj in self.objects:
+            if key in (obj.name, obj.ref, obj.index):
+                return obj
+        return None
+
+
+def stream_loss(streams_delta, tplds_delta):
+    """ Frame loss of streams - transmitted packets minus packets received by all TPLDs with the stream TPLD ID.
+
+    The TPLD ID of each stream row is the stream cached TPLD ID (see XenaStream.get_tpld_id), so streams and TPLDs
+    that were added or removed between the reads are matched correctly.
+
+    :param streams_delta: streams statistics delta.
+    :type streams_delta: xenavalkyrie.xena_statistics_view.XenaStatsDelta
+    :param tplds_delta: TPLDs statistics delta.
+    :type tplds_delta: xenavalkyrie.xena_statistics_view.XenaStatsDelta
+    :return: ([streams] array of lost packets, [streams] array of loss ratio), in streams delta rows order.
+    """
+
+    tpld_ids = numpy.array([s.get_tpld_id() for s in streams_delta.rows], dtype=numpy.int64)
+    rows_ids = numpy.array([t.id for t in tplds_delta.rows], dtype=numpy.int64)
+    size = max(tpld_ids.max() if len(tpld_ids) else 0, rows_ids.max() if len(rows_ids) else 0) + 1
+    rx_per_id = numpy.zeros(size, dtype=numpy.int64)
+    if len(rows_ids):
+        numpy.add.at(rx_per_id, rows_ids, tplds_delta.column('pr_tpldtraffic', 'pac'))
+    rx = numpy.where(tpld_ids >= 0, rx_per_id[numpy.maximum(tpld_ids, 0)], 0)
+    tx = streams_delta.column('packets')
+    return tx - rx, _ratio(tx - rx, tx)
+
+
+def _ratio(numerator, denominator):
+    return numerator / numpy.where(denominator != 0, denominator, 1).astype(numpy.float64) * (denominator != 0)
+
+
+def flat_name(group, caption):
+    """
+    :param group: statistics group, None for objects with single statistics group.
+    :param caption: statistics caption.
+    :return: flat counter name - group_caption, or caption for objects with single statistics group.
+    """
+
+    return '{}_{}'.format(group, caption) if group else caption
+
+
+def stats_groups(obj):
+    """
+    :param obj: object with stats_captions.
+    :return: dictionary {statistics command: captions} of the object.
+    """
+
+    if isinstance(obj.stats_captions, dict):
+        return obj.stats_captions
+    return {XenaStatsPlan.stats_commands[obj.type]: obj.stats_captions}
 
 
 class XenaStats(object):
     """ Base class for all statistics views. """
 
-    def __init__(self, session):
+    def __init__(self, session, counters=None):
         """
         :param session: current session
         :type session: xenavalkyrie.xena_app.XenaSession
+        :param counters: list of groups and/or flat counters names to read (see XenaStatsPlan). If None - all.
         """
 
         self.session = session
+        self.counters = counters
         self.statistics = None
+        self.plan = None
+        self.times = None
+        # Columnar tables of the last read {object type: XenaStatsTable} - see read_tables of each view.
+        self.tables = None
+
+    @property
+    def skew(self):
+        """
+        :return: maximum collection skew, in seconds, between objects of the last read.
+        """
+
+        return max(t.skew for t in self.times.values()) if self.times else 0
 
     def get_flat_stats(self):
         """
@@ -39,6 +532,31 @@ class XenaStats(object):
             flat_stats[obj.name] = flat_obj_stats
         return flat_stats
 
+    #
+    # Private methods.
+    #
+
+    def _read_tables(self, objects, types, tplds_ports=()):
+        """ Read statistics of objects, re-planning only when the objects list changed since the last read.
+
+        TPLDs of tplds_ports are discovered in the same read as the statistics, and the statistics of all their known
+        TPLDs are read. Only if TPLDs were added or removed the statistics are read again with the new TPLDs.
+
+        :return: list of statistics tables, one per requested object type.
+        """
+        objects = list(objects)
+        tplds_ports = list(tplds_ports)
+        for _ in range(2):
+            all_objects = objects + [t for p in tplds_ports for t in p.get_objects_by_type('tpld')]
+            if self.plan is None or self.plan.objects != all_objects or self.plan.discover != tplds_ports:
+                self.plan = XenaStatsPlan(all_objects, tplds_ports, self.counters)
+            self.tables = self.plan.read_tables()
+            changed = [p._update_tplds(ids) for p, ids in self.plan.discovered.items()]
+            if not any(changed):
+                break
+        self.times = self.plan.times
+        return [self.tables.get(t, XenaStatsTable([], [], numpy.zeros((0, 0), dtype=numpy.int64))) for t in types]
+
 
 class XenaPortsStats(XenaStats):
     """ Ports statistics view.
@@ -60,13 +578,23 @@ class XenaPortsStats(XenaStats):
         """ Read current ports statistics from chassis.
 
         :return: dictionary {port name {group name, {stat name: stat value}}}
+        :rtype: xenavalkyrie.xena_statistics_view.XenaStatsDict
         """
 
-        self.statistics = XenaObjectsDict()
-        for port in self.session.ports.values():
-            self.statistics[port] = port.read_port_stats()
+        table = self.read_tables()
+        self.statistics = XenaStatsDict(table.rows, table.__getitem__)
         return self.statistics
 
+    def read_tables(self):
+        """ Read current ports statistics from chassis into columnar table, without building per port dictionaries.
+
+        :return: ports statistics table.
+        :rtype: xenavalkyrie.xena_statistics_view.XenaStatsTable
+        """
+
+        table, = self._read_tables(self.session.ports.values(), ['port'])
+        return table
+
 
 class XenaStreamsStats(XenaStats):
     """ Streams statistics view.
@@ -91,28 +619,46 @@ class XenaStreamsStats(XenaStats):
     def read_stats(self):
         """ Read current statistics from chassis.
 
+        Streams are joined to TPLDs by the streams cached TPLD IDs (see XenaStream.get_tpld_id) through TPLD ID index.
+        The TPLD ID of each stream is also available in tpld_ids, in the order of the streams table.
+
         :return: dictionary {stream: {tx: {stat name: stat value}} rx: {tpld: {stat group {stat name: value}}}}
+        :rtype: xenavalkyrie.xena_statistics_view.XenaStatsDict
         """
 
-        self.tx_statistics = XenaObjectsDict()
-        for port in self.session.ports.values():
-            for stream in port.streams.values():
-                self.tx_statistics[stream] = stream.read_stats()
+        streams_table, tplds_table = self.read_tables()
+        tx_statistics = XenaStatsDict(streams_table.rows, streams_table.__getitem__)
+        rx_statistics = XenaStatsDict(tplds_table.rows, tplds_table.__getitem__)
+
+        # {TPLD ID: list of TPLDs (on different RX ports)}
+        rx_index = {}
+        for tpld in tplds_table:
+            rx_index.setdefault(tpld.id, []).append(tpld)
+        tpld_ids = dict(zip(streams_table.rows, self.tpld_ids))
 
-        tpld_statistics = XenaTpldsStats(self.session).read_stats()
+        def stream_statistics(stream):
+            rx = TgnSubStatsDict()
+            for tpld in rx_index.get(tpld_ids[stream], []):
+                rx[tpld.parent] = rx_statistics[tpld]
+            return OrderedDict([('tx', tx_statistics[stream]), ('rx', rx)])
 
-        self.statistics = XenaObjectsDict()
-        for stream, stream_stats in self.tx_statistics.items():
-            self.statistics[stream] = OrderedDict()
-            self.statistics[stream]['tx'] = stream_stats
-            self.statistics[stream]['rx'] = TgnSubStatsDict()
-            ps_tpldid = stream.get_attribute('ps_tpldid')
-            stream_tpld = int(ps_tpldid) if ps_tpldid else -1
-            for tpld, tpld_stats in tpld_statistics.items():
-                if tpld.id == stream_tpld:
-                    self.statistics[stream]['rx'][tpld.parent] = tpld_stats
+        self.tx_statistics = tx_statistics
+        self.statistics = XenaStatsDict(streams_table.rows, stream_statistics)
         return self.statistics
 
+    def read_tables(self):
+        """ Read current streams and TPLDs statistics from chassis into columnar tables, without building per object
+        dictionaries.
+
+        :return: (streams statistics table, TPLDs statistics table).
+        """
+
+        ports = list(self.session.ports.values())
+        streams = [s for p in ports for s in p.streams.values()]
+        streams_table, tplds_table = self._read_tables(streams, ['stream', 'tpld'], ports)
+        self.tpld_ids = [s.get_tpld_id() for s in streams_table.rows]
+        return streams_table, tplds_table
+
     def get_flat_stats(self):
         return OrderedDict({str(k): v for k, v in self.tx_statistics.items()})
 
@@ -137,10 +683,19 @@ class XenaTpldsStats(XenaStats):
         """ Read current statistics from chassis.
 
         :return: dictionary {tpld full index {group name {stat name: stat value}}}
+        :rtype: xenavalkyrie.xena_statistics_view.XenaStatsDict
         """
 
-        self.statistics = XenaObjectsDict()
-        for port in self.session.ports.values():
-            for tpld in port.tplds.values():
-                self.statistics[tpld] = tpld.read_stats()
+        table = self.read_tables()
+        self.statistics = XenaStatsDict(table.rows, table.__getitem__)
         return self.statistics
+
+    def read_tables(self):
+        """ Read current TPLDs statistics from chassis into columnar table, without building per TPLD dictionaries.
+
+        :return: TPLDs statistics table.
+        :rtype: xenavalkyrie.xena_statistics_view.XenaStatsTable
+        """
+
+        table, = self._read_tables([], ['tpld'], self.session.ports.values())
+        return table
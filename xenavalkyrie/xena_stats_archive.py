@@ -0,0 +1,180 @@
+"""
+Classes and utilities to archive Xena statistics time series on disk.
+
+Archive file is a header followed by fixed width records, one record per (timestamp, object, statistics group):
+
++---------------------------------------------------------------------------------+
+| magic (8 bytes) | header length (uint32) | JSON header | padding to 8 bytes      |
++---------------------------------------------------------------------------------+
+| timestamp (float64) | object (uint32) | group (uint32) | counters (int64 x width) |
++---------------------------------------------------------------------------------+
+| ...                                                                             |
++---------------------------------------------------------------------------------+
+
+The JSON header describes the objects (references, unique across chassis, and display names), the statistics groups
+and their captions (stats_captions). Records are only appended, so readers, in the same or another process, map the
+file with numpy.memmap while it is written and see all records that were completely written (call refresh to map new
+records).
+
+:author: yoram@ignissoft.com
+"""
+
+import os
+import json
+import struct
+import time
+
+import numpy
+
+from xenavalkyrie.xena_object import monotonic
+
+magic = b'XENASTAT'
+version = 1
+
+
+def _records_dtype(width):
+    return numpy.dtype([('timestamp', '<f8'), ('object', '<u4'), ('group', '<u4'), ('counters', '<i8', (width,))])
+
+
+class XenaStatsArchiveWriter(object):
+    """ Append statistics plan reads to archive file. """
+
+    def __init__(self, file_name, plan, append=False):
+        """
+        :param file_name: archive file name.
+        :param plan: statistics plan whose reads will be appended.
+        :type plan: xenavalkyrie.xena_statistics_view.XenaStatsPlan
+        :param append: True - append to existing archive of the same plan, False - overwrite existing file.
+        """
+
+        self.file_name = file_name
+
+        objects = []
+        names = []
+        groups = []
+        captions = {}
+        positions_object = []
+        positions_group = []
+        for (obj, group), (_, _, layout_captions) in zip(plan.batch, plan.layout):
+            if obj.ref not in objects:
+                objects.append(obj.ref)
+                names.append(obj.name)
+            if group not in groups:
+                groups.append(group)
+                captions[group] = list(layout_captions)
+            positions_object.append(objects.index(obj.ref))
+            positions_group.append(groups.index(group))
+        self.width = max([len(c) for c in captions.values()] or [0])
+        self.dtype = _records_dtype(self.width)
+        self.positions_object = numpy.array(positions_object, dtype=numpy.uint32)
+        self.positions_group = numpy.array(positions_group, dtype=numpy.uint32)
+
+        header = json.dumps({'version': version, 'objects': objects, 'names': names, 'groups': groups,
+                             'captions': captions, 'width': self.width}).encode('utf-8')
+        header += b' ' * (-(len(magic) + 4 + len(header)) % 8)
+        header = magic + struct.pack('<I', len(header)) + header
+        if append and os.path.exists(file_name):
+            with open(file_name, 'rb') as f:
+                if f.read(len(header)) != header:
+                    raise ValueError('{} is not statistics archive of the same objects and groups'.format(file_name))
+            self.file = open(file_name, 'ab')
+        else:
+            self.file = open(file_name, 'wb')
+            self.file.write(header)
+            self.file.flush()
+        # Offset to convert local monotonic timestamps to wall clock time.
+        self._time_offset = time.time() - monotonic()
+
+    def append(self, timestamp, values):
+        """ Append single plan read.
+
+        :param timestamp: local monotonic read timestamp.
+        :param values: plan read values (XenaStatsPlan.read_values).
+        """
+
+        records = numpy.zeros(len(self.positions_object), dtype=self.dtype)
+        records['timestamp'] = timestamp + self._time_offset
+        records['object'] = self.positions_object
+        records['group'] = self.positions_group
+        counters = records['counters']
+        for row, row_values in enumerate(values[:len(records)]):
+            row_values = row_values[:self.width]
+            counters[row, :len(row_values)] = row_values
+        self.file.write(records.tobytes())
+        self.file.flush()
+
+    def close(self):
+        """ Flush and close the archive file. """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class XenaStatsArchive(object):
+    """ Read statistics archive file.
+
+    Objects are identified by their references (obj.ref), names (that may repeat, like streams comments) are for
+    display only (see names).
+
+    Usage example - RX packets of one port during the last hour::
+
+        archive = XenaStatsArchive('soak.xstats')
+        records = archive.query(start=time.time() - 3600, objects=[port.ref], groups=['pr_total'])
+        rx_packets = records['counters'][:, archive.captions['pr_total'].index('packets')]
+    """
+
+    def __init__(self, file_name):
+        """
+        :param file_name: archive file name.
+        """
+
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            if f.read(len(magic)) != magic:
+                raise ValueError('{} is not statistics archive'.format(file_name))
+            header_len, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        self.objects = header['objects']
+        self.names = header['names']
+        self.groups = header['groups']
+        self.captions = header['captions']
+        self.dtype = _records_dtype(header['width'])
+        self.offset = len(magic) + 4 + header_len
+        self.records = None
+        self.refresh()
+
+    def refresh(self):
+        """ Map all records written so far. """
+
+        count = (os.path.getsize(self.file_name) - self.offset) // self.dtype.itemsize
+        if count:
+            self.records = numpy.memmap(self.file_name, dtype=self.dtype, mode='r', offset=self.offset, shape=(count,))
+        else:
+            self.records = numpy.zeros(0, dtype=self.dtype)
+
+    def query(self, start=None, end=None, objects=None, groups=None):
+        """ Get records by time range, objects and groups.
+
+        Time range selection is view of the mapped records (no copy), objects and groups selections are copies.
+
+        :param start: start time (seconds since epoch, inclusive). If None - from first record.
+        :param end: end time (seconds since epoch, inclusive). If None - until last record.
+        :param objects: list of objects references. If None - all objects.
+        :param groups: list of statistics groups. If None - all groups.
+        :return: records array with timestamp, object (index in objects), group (index in groups) and counters fields.
+        """
+
+        records = self.records
+        timestamps = records['timestamp']
+        first = numpy.searchsorted(timestamps, start, 'left') if start is not None else 0
+        last = numpy.searchsorted(timestamps, end, 'right') if end is not None else len(records)
+        records = records[first:last]
+        if objects is not None:
+            records = records[numpy.isin(records['object'], [self.objects.index(o) for o in objects])]
+        if groups is not None:
+            records = records[numpy.isin(records['group'], [self.groups.index(g) for g in groups])]
+        return records
@@ -0,0 +1,183 @@
+"""
+Classes and utilities to export Xena statistics as they are read.
+
+Writers append one line per object per sample (CSV or JSON Lines), optionally compressed, so long runs are written
+incrementally with flat memory. Samples are statistics tables (views read_tables) or views statistics dictionaries
+(views read_stats, for example streams statistics with nested TX and RX statistics). Columns order is the statistics
+table columns order (derived from stats_captions), or the flattened dictionary keys order, and it is fixed by the first
+written sample.
+
+Usage example - write ports statistics every second::
+
+    ports_stats = XenaPortsStats(session)
+    with XenaStatsCsvWriter('ports.csv.gz') as writer:
+        while running:
+            writer.write(ports_stats.read_tables())
+            time.sleep(1)
+
+:author: yoram@ignissoft.com
+"""
+
+import time
+import json
+import gzip
+import logging
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+from future.utils import with_metaclass
+
+from xenavalkyrie.xena_object import monotonic
+from xenavalkyrie.xena_statistics_view import XenaStatsTable
+
+logger = logging.getLogger(__name__)
+
+
+class XenaStatsWriter(with_metaclass(ABCMeta, object)):
+    """ Base class for all statistics writers. """
+
+    def __init__(self, file_name, columns=None, compression=None, flush_samples=1, flush_interval=None):
+        """
+        :param file_name: output file name.
+        :param columns: list of flat column names (group_caption) to write. If None - all columns.
+        :param compression: None, 'gzip' or 'lzma'. If None - deduced from file extension (.gz, .xz, .lzma).
+        :param flush_samples: flush to disk every flush_samples samples. If None - do not flush by samples count.
+        :param flush_interval: flush to disk every flush_interval seconds. If None - do not flush by time.
+        """
+
+        if compression is None:
+            compression = ('gzip' if file_name.endswith('.gz') else
+                           'lzma' if file_name.endswith('.xz') or file_name.endswith('.lzma') else None)
+        if compression == 'gzip':
+            self.file = gzip.open(file_name, 'wb')
+        elif compression == 'lzma':
+            import lzma
+            self.file = lzma.open(file_name, 'wb')
+        else:
+            self.file = open(file_name, 'wb')
+
+        self.columns = columns
+        self.flush_samples = flush_samples
+        self.flush_interval = flush_interval
+        self.samples = 0
+        self.indices = None
+        self._header_written = False
+        self._dropped_columns = set()
+        self._last_flush = monotonic()
+        # Offset to convert local monotonic timestamps to wall clock time.
+        self._time_offset = time.time() - monotonic()
+
+    def write(self, statistics):
+        """ Write single sample.
+
+        :param statistics: statistics table (views read_tables, or any table of a view tables) or views statistics
+            dictionary {object: nested dictionaries of values} (views read_stats). Dictionaries are flattened into
+            key_key_... columns and written with the current time as timestamp. Keys that were not in the first
+            written dictionary are not written (a warning is logged once per key).
+        :raises ValueError: if the table does not have all the requested columns (nothing is written).
+        """
+
+        if isinstance(statistics, XenaStatsTable):
+            flat_columns = statistics.flat_columns()
+            if self.indices is None:
+                columns = self.columns if self.columns is not None else flat_columns
+                unknown = [c for c in columns if c not in flat_columns]
+                if unknown:
+                    raise ValueError('Unknown statistics columns {}, columns must be flat counters names (for example '
+                                     'pr_total_packets, see XenaStatsPlan.expand_counters)'.format(unknown))
+                self._set_columns(columns)
+                self.indices = [flat_columns.index(c) for c in self.columns]
+            names = [o.name for o in statistics.rows]
+            values = statistics.values[:, self.indices].tolist()
+            timestamps = (statistics.timestamps + self._time_offset).tolist()
+        else:
+            flat_rows = [(str(o), _flatten(s)) for o, s in statistics.items()]
+            flat_columns = list(OrderedDict((c, None) for _, f in flat_rows for c in f))
+            if not self._header_written:
+                self._set_columns(flat_columns)
+            dropped = [c for c in flat_columns if c not in self.columns and c not in self._dropped_columns]
+            if dropped:
+                self._dropped_columns.update(dropped)
+                logger.warning('Statistics columns {} are not in the output columns, not written'.format(dropped))
+            names = [n for n, _ in flat_rows]
+            values = [[f.get(c) for c in self.columns] for _, f in flat_rows]
+            timestamps = [time.time()] * len(flat_rows)
+        self.file.write(''.join(self._format_line(t, n, v) for t, n, v in zip(timestamps, names, values)).
+                        encode('utf-8'))
+
+        self.samples += 1
+        now = monotonic()
+        if ((self.flush_samples and self.samples % self.flush_samples == 0) or
+                (self.flush_interval is not None and now - self._last_flush >= self.flush_interval)):
+            self.file.flush()
+            self._last_flush = now
+
+    def close(self):
+        """ Flush and close the output file. """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #
+    # Private methods.
+    #
+
+    def _set_columns(self, flat_columns):
+        self.columns = self.columns if self.columns is not None else flat_columns
+        if not self._header_written:
+            self._write_header()
+            self._header_written = True
+
+    def _write_header(self):
+        pass
+
+    @abstractmethod
+    def _format_line(self, timestamp, name, values):
+        """
+        :return: output line of single object in single sample.
+        """
+        pass
+
+
+class XenaStatsCsvWriter(XenaStatsWriter):
+    """ Write statistics as CSV - timestamp (seconds since epoch), object name and one column per counter. """
+
+    def _write_header(self):
+        self.file.write((','.join(_csv_field(c) for c in ['timestamp', 'object'] + self.columns) + '\n').
+                        encode('utf-8'))
+
+    def _format_line(self, timestamp, name, values):
+        return '{:.6f},{},{}\n'.format(timestamp, _csv_field(name),
+                                       ','.join(str(v) if v is not None else '' for v in values))
+
+
+class XenaStatsJsonWriter(XenaStatsWriter):
+    """ Write statistics as JSON Lines - {timestamp: seconds since epoch, object: name, column: value, ...}. """
+
+    def _format_line(self, timestamp, name, values):
+        line = OrderedDict([('timestamp', round(timestamp, 6)), ('object', name)])
+        line.update(zip(self.columns, values))
+        return json.dumps(line, separators=(',', ':')) + '\n'
+
+
+def _flatten(stats, prefix=''):
+    """ Flatten nested statistics dictionaries into {key_key_...: value}, keys are converted to strings. """
+
+    flat = OrderedDict()
+    for key, value in stats.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '_'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _csv_field(value):
+    if any(c in value for c in ',"\n'):
+        return '"{}"'.format(value.replace('"', '""'))
+    return value
@@ -0,0 +1,166 @@
+"""
+Classes and utilities to sample Xena statistics in the background.
+
+The sampler reads statistics plan at fixed interval, in background thread, and writes each sample into preallocated
+NumPy ring buffers, one buffer per statistics group shaped [samples, objects, counters], so memory does not grow with
+the run duration. Optionally each sample is also appended to on-disk archive (see xena_stats_archive) for long runs and
+for readers in other processes.
+
+:author: yoram@ignissoft.com
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy
+
+from xenavalkyrie.xena_object import monotonic
+from xenavalkyrie.xena_statistics_view import XenaStatsPlan
+from xenavalkyrie.xena_stats_archive import XenaStatsArchiveWriter
+
+logger = logging.getLogger(__name__)
+
+
+class StatsSampler(object):
+    """ Background statistics sampler.
+
+    Usage example - sample all ports every second and read the last minute of RX packets::
+
+        sampler = StatsSampler(session.ports.values(), interval=1, capacity=3600)
+        sampler.start()
+        ...
+        timestamps, pr_total = sampler.latest('pr_total', 60)
+        rx_packets = pr_total[:, :, sampler.captions['pr_total'].index('packets')]
+        sampler.stop()
+    """
+
+    def __init__(self, objects, interval=1, capacity=3600, counters=None, archive=None):
+        """
+        :param objects: list of objects (ports, streams, TPLDs) to sample.
+        :param interval: sampling interval in seconds.
+        :param capacity: number of samples to keep, older samples are overwritten.
+        :param counters: list of groups and/or flat counters names to sample (see XenaStatsPlan). If None - all.
+        :param archive: archive file name to append all samples to (existing file is overwritten). The archive is
+            closed on stop and re-opened, for append, on start. If None - do not archive.
+        """
+
+        self.plan = XenaStatsPlan(objects, counters=counters)
+        self.archive = XenaStatsArchiveWriter(archive, self.plan) if archive else None
+        self.interval = interval
+        self.capacity = capacity
+
+        # {group: list of objects}, {group: captions} and {group: list of positions in plan batch}.
+        self.objects = OrderedDict()
+        self.captions = OrderedDict()
+        self.positions = OrderedDict()
+        for position, ((obj, group), (_, _, captions)) in enumerate(zip(self.plan.batch, self.plan.layout)):
+            self.objects.setdefault(group, []).append(obj)
+            self.captions[group] = list(captions)
+            self.positions.setdefault(group, []).append(position)
+
+        self.timestamps = numpy.zeros(capacity, dtype=numpy.float64)
+        self.buffers = OrderedDict((g, numpy.zeros((capacity, len(o), len(self.captions[g])), dtype=numpy.int64))
+                                   for g, o in self.objects.items())
+        self.count = 0
+        self.errors = 0
+        # Incremented before and after each write of the ring buffers (odd while writing) so readers detect copies
+        # that overlap concurrent writes.
+        self._sequence = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Start sampling in background thread. """
+
+        if self.archive and self.archive.file.closed:
+            self.archive = XenaStatsArchiveWriter(self.archive.file_name, self.plan, append=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling, wait for the background thread to finish and close the archive. """
+
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.archive:
+            self.archive.close()
+
+    def sample(self):
+        """ Read single sample and write it into the ring buffers. """
+
+        values = self.plan.read_values()
+        timestamp = min(t.timestamp for t in self.plan.times.values())
+        slot = self.count % self.capacity
+        with self._lock:
+            self._sequence += 1
+        for group, positions in self.positions.items():
+            captions_len = len(self.captions[group])
+            buffer = self.buffers[group][slot]
+            # Clear the slot so counters missing from short replies are not left from the overwritten sample.
+            buffer.fill(0)
+            for row, position in enumerate(positions):
+                counters = values[position][:captions_len]
+                buffer[row, :len(counters)] = counters
+        self.timestamps[slot] = timestamp
+        with self._lock:
+            self.count += 1
+            self._sequence += 1
+        if self.archive and not self.archive.file.closed:
+            self.archive.append(timestamp, values)
+
+    def latest(self, group, n=1):
+        """ Get latest samples of statistics group.
+
+        Reads do not block the sampler. When the requested samples are contiguous in the ring buffer and do not include
+        the next slot the sampler writes to (n < capacity) the returned arrays are views into the buffer (no copy) that
+        remain valid until the sampler overwrites them (capacity - n samples later), else they are consistent copies.
+
+        :param group: statistics group (statistics command) name.
+        :param n: number of samples to return. If larger than the number of available samples - all available samples.
+        :return: (timestamps, values) - timestamps is [samples] array of local monotonic times and values is
+            [samples, objects, counters] array, oldest sample first. See objects and captions for the axes.
+        """
+
+        while True:
+            with self._lock:
+                count = self.count
+                sequence = self._sequence
+            samples = min(n, count, self.capacity)
+            end = (count % self.capacity or self.capacity) if count else 0
+            if samples <= end and samples < self.capacity:
+                return self.timestamps[end - samples:end], self.buffers[group][end - samples:end]
+            indices = numpy.arange(end - samples, end) % self.capacity
+            timestamps, values = self.timestamps[indices], self.buffers[group][indices]
+            with self._lock:
+                if self._sequence == sequence and (sequence % 2 == 0 or count % self.capacity not in indices):
+                    return timestamps, values
+
+    #
+    # Private methods.
+    #
+
+    def _run(self):
+        next_sample = monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.sample()
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning('Statistics sample failed - {}'.format(repr(e)))
+                next_sample += self.interval
+                # Skip missed samples so slow reads do not accumulate delay.
+                now = monotonic()
+                while next_sample <= now:
+                    next_sample += self.interval
+                self._stop.wait(next_sample - now)
+        finally:
+            if self.archive:
+                self.archive.close()
@@ -5,7 +5,9 @@ Classes and utilities that represents Xena XenaManager-2G stream.
 """
 
 import re
+import copy
 import binascii
+import threading
 from enum import Enum
 from collections import OrderedDict
 
@@ -40,6 +42,12 @@ class XenaStream(XenaObject21):
 
     next_tpld_id = 0
 
+    headers_cache = OrderedDict()
+    """ LRU cache of decoded packet headers {ps_packetheader: pypacker.layer12.ethernet.Ethernet}. """
+    headers_cache_size = 1024
+    """ Maximum number of decoded packet headers in cache, 0 to disable the cache. """
+    _headers_cache_lock = threading.Lock()
+
     def __init__(self, parent, index, name=''):
         """
         :param parent: parent port object.
@@ -48,6 +56,31 @@ class XenaStream(XenaObject21):
         """
 
         super(self.__class__, self).__init__(objType='stream', index=index, parent=parent, name=name)
+        self.config = None
+        self.tpld_id = None
+        self.packet_headers_key = None
+
+    def set_attributes(self, **attributes):
+        """ Sets list of attributes and keeps the cached TPLD ID in sync.
+
+        :param attributes: dictionary of {attribute: value} to set.
+        """
+        super(self.__class__, self).set_attributes(**attributes)
+        if 'ps_tpldid' in attributes:
+            self.tpld_id = int(attributes['ps_tpldid'])
+
+    def get_tpld_id(self):
+        """ Get stream TPLD ID.
+
+        The TPLD ID is cached when the stream is configured (add_stream, add_streams, set_attributes, hydrate) so it is
+        read from the chassis only if it was not set or learned through the package.
+
+        :return: stream TPLD ID, -1 if the stream has no TPLD.
+        """
+        if self.tpld_id is None:
+            ps_tpldid = self.get_attribute('ps_tpldid')
+            self.tpld_id = int(ps_tpldid) if ps_tpldid else -1
+        return self.tpld_id
 
     def del_object_from_parent(self):
         self.send_command('ps_delete')
@@ -69,13 +102,17 @@ class XenaStream(XenaObject21):
         return self.read_stat(XenaStream.stats_captions, 'pt_stream')
 
     def get_packet_headers(self):
-        """
+        """ Get packet headers.
+
+        Decoded headers are cached by the raw headers value so repeated reads of the same headers do not re-parse.
+        Each call returns a copy of the cached headers object that can be modified freely.
+
         :return: current packet headers
         :rtype: pypacker.layer12.ethernet.Ethernet
         """
 
-        bin_headers = self.get_attribute('ps_packetheader')
-        return Ethernet(binascii.unhexlify(bin_headers[2:]))
+        self.packet_headers_key = self.get_attribute('ps_packetheader')
+        return self._decode_packet_headers(self.packet_headers_key)
 
     def set_packet_headers(self, headers):
         """ Set packet header.
@@ -90,21 +127,47 @@ class XenaStream(XenaObject21):
         :type headers: pypacker.layer12.ethernet.Ethernet
         """
 
-        bin_headers = '0x' + binascii.hexlify(headers.bin()).decode('utf-8')
-        self.set_attributes(ps_packetheader=bin_headers)
-
-        body_handler = headers
-        ps_headerprotocol = []
-        while body_handler:
-            segment = pypacker_2_xena.get(str(body_handler).split('(')[0].lower(), None)
-            if not segment:
-                self.logger.warning('pypacker header {} not in conversion list'.format(segment))
-                return
-            ps_headerprotocol.append(segment)
-            if type(body_handler) is Ethernet and body_handler.vlan:
-                ps_headerprotocol.append('vlan')
-            body_handler = body_handler.body_handler
-        self.set_attributes(ps_headerprotocol=' '.join(ps_headerprotocol))
+        if self.packet_headers_key is not None:
+            with self._headers_cache_lock:
+                self.headers_cache.pop(self.packet_headers_key, None)
+            self.packet_headers_key = None
+        ps_packetheader, ps_headerprotocol = self._encode_packet_headers(headers)
+        self.set_attributes(ps_packetheader=ps_packetheader)
+        if ps_headerprotocol:
+            self.set_attributes(ps_headerprotocol=ps_headerprotocol)
+
+    @classmethod
+    def _decode_packet_headers(cls, ps_packetheader):
+        """
+        :param ps_packetheader: ps_packetheader value.
+        :return: copy of the decoded packet headers, decoded from cache if available.
+        :rtype: pypacker.layer12.ethernet.Ethernet
+        """
+
+        with cls._headers_cache_lock:
+            headers = cls.headers_cache.pop(ps_packetheader, None)
+            if headers is None:
+                headers = Ethernet(binascii.unhexlify(ps_packetheader[2:]))
+            if cls.headers_cache_size:
+                cls.headers_cache[ps_packetheader] = headers
+                while len(cls.headers_cache) > cls.headers_cache_size:
+                    cls.headers_cache.popitem(last=False)
+            return copy.deepcopy(headers)
+
+    def _encode_packet_headers(self, headers):
+        """
+        :param headers: packet headers
+        :type headers: pypacker.layer12.ethernet.Ethernet
+        :return: (ps_packetheader value, ps_headerprotocol value). ps_headerprotocol is None if some pypacker header
+            is not in the conversion list.
+        """
+
+        ps_packetheader = '0x' + binascii.hexlify(headers.bin()).decode('utf-8')
+        try:
+            return ps_packetheader, get_headers_protocol(headers)
+        except KeyError as e:
+            self.logger.warning('pypacker header {} not in conversion list'.format(e.args[0]))
+            return ps_packetheader, None
 
     #
     # Modifiers.
@@ -124,35 +187,70 @@ class XenaStream(XenaObject21):
         else:
             modifier = XenaXModifier(self, index='{}/{}'.format(self.index, len(self.xmodifiers)))
         modifier._create()
-        modifier.get()
+        known_values = ['position', 'mask', 'action', 'repeat']
+        if kwargs.get('action') != XenaModifierAction.random:
+            known_values += ['min_val', 'step', 'max_val']
+        if not all(v in kwargs for v in known_values):
+            modifier.get()
         modifier.set(**kwargs)
         return modifier
 
+    def set_modifiers(self, modifiers=None, xmodifiers=None):
+        """ Set all stream modifiers.
+
+        Modifiers counts and all modifiers values are set in one batch, with no read-back as all values are known.
+
+        :param modifiers: list of standard modifiers values, each is dictionary of modifier attributes (position, mask,
+            action, repeat, min_val, step, max_val). Missing attributes get default values (see
+            XenaModifier.default_values). If None - do not change standard modifiers.
+        :param xmodifiers: list of extended modifiers values, same as modifiers (default values are
+            XenaXModifier.default_values). If None - do not change extended modifiers.
+        """
+
+        batch = []
+        for modifier_class, count_attribute, values_list in ((XenaModifier, 'ps_modifiercount', modifiers),
+                                                            (XenaXModifier, 'ps_modifierextcount', xmodifiers)):
+            if values_list is None:
+                continue
+            current_modifiers = {m.id: m for m in self.objects.values() if type(m) == modifier_class}
+            for modifier in current_modifiers.values():
+                if modifier.id >= len(values_list):
+                    self.objects.pop(modifier.ref)
+            batch.append((self, count_attribute, len(values_list)))
+            for index, values in enumerate(values_list):
+                modifier = current_modifiers.get(index)
+                if not modifier:
+                    modifier = modifier_class(self, index='{}/{}'.format(self.index, index))
+                for k, v in dict(modifier_class.default_values, **values).items():
+                    setattr(modifier, k, v)
+                batch.extend(modifier._set_batch())
+        self.api.send_command_batch(batch)
+
     def remove_modifier(self, index, m_type=XenaModifierType.standard):
         """ Remove modifier.
 
+        Modifiers after the removed modifier are shifted one place down and the modifiers count is decremented, all in
+        one batch. Local modifiers objects are updated in place.
+
         :param m_type: modifier type - standard or extended.
         :param index: index of modifier to remove.
         """
 
         if m_type == XenaModifierType.standard:
-            current_modifiers = OrderedDict(self.modifiers)
-            del current_modifiers[index]
-
-            self.set_attributes(ps_modifiercount=0)
-            self.del_objects_by_type('modifier')
-
+            modifiers = self.modifiers
+            count_attribute = 'ps_modifiercount'
         else:
-            current_modifiers = OrderedDict(self.xmodifiers)
-            del current_modifiers[index]
-
-            self.set_attributes(ps_modifierextcount=0)
-            self.del_objects_by_type('xmodifier')
-
-        for modifier in current_modifiers.values():
-            self.add_modifier(m_type,
-                              mask=modifier.mask, action=modifier.action, repeat=modifier.repeat,
-                              min_val=modifier.min_val, step=modifier.step, max_val=modifier.max_val)
+            modifiers = self.xmodifiers
+            count_attribute = 'ps_modifierextcount'
+
+        self.objects.pop(modifiers[index].ref)
+        batch = []
+        for modifier_id in sorted(m for m in modifiers if m > index):
+            modifier = modifiers[modifier_id]
+            modifier._set_index(modifier_id - 1)
+            batch.extend(modifier._set_batch())
+        batch.append((self, count_attribute, len(modifiers) - 1))
+        self.api.send_command_batch(batch)
 
     #
     # Properties.
@@ -163,7 +261,7 @@ class XenaStream(XenaObject21):
         """
         :return: dictionary {index: object} of standard modifiers.
         """
-        if not self.get_objects_by_type('modifier'):
+        if not self.get_objects_by_type('modifier') and self.config is None:
             for index in range(int(self.get_attribute('ps_modifiercount'))):
                 XenaModifier(self, index='{}/{}'.format(self.index, index)).get()
         return {s.id: s for s in self.get_objects_by_type('modifier')}
@@ -173,7 +271,7 @@ class XenaStream(XenaObject21):
         """
         :return: dictionary {index: object} of extended modifiers.
         """
-        if not self.get_objects_by_type('xmodifier'):
+        if not self.get_objects_by_type('xmodifier') and self.config is None:
             try:
                 for index in range(int(self.get_attribute('ps_modifierextcount'))):
                     XenaXModifier(self, index='{}/{}'.format(self.index, index)).get()
@@ -184,6 +282,9 @@ class XenaStream(XenaObject21):
 
 class _XenaModifierBase(XenaObject):
 
+    default_values = {}
+    """ Modifier attributes values for set_modifiers, defined by each modifier type. """
+
     def __init__(self, objType, parent, index):
         super(_XenaModifierBase, self).__init__(objType=objType, index=index, parent=parent)
 
@@ -199,39 +300,60 @@ class _XenaModifierBase(XenaObject):
     def set(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
+        self.api.send_command_batch(self._set_batch())
+
+    def get(self):
         if type(self) == XenaModifier:
-            self.set_attributes(ps_modifier='{} {} {} {}'.format(self.position, self.mask,
-                                                                 self.action.value, self.repeat))
+            self._parse_modifier(self.get_attribute('ps_modifier'))
         else:
-            self.set_attributes(ps_modifierext='{} {} {} {}'.format(self.position, self.mask,
-                                                                    self.action.value, self.repeat))
+            self._parse_modifier(self.get_attribute('ps_modifierext'))
         if self.action != XenaModifierAction.random:
             if type(self) == XenaModifier:
-                self.set_attributes(ps_modifierrange='{} {} {}'.format(self.min_val, self.step, self.max_val))
+                self._parse_range(self.get_attribute('ps_modifierrange'))
             else:
-                self.set_attributes(ps_modifierextrange='{} {} {}'.format(self.min_val, self.step, self.max_val))
+                self._parse_range(self.get_attribute('ps_modifierextrange'))
 
-    def get(self):
+    #
+    # Private methods.
+    #
+
+    def _set_batch(self):
+        """
+        :return: batch of commands to set the modifier current values.
+        """
         if type(self) == XenaModifier:
-            position, mask, action, repeat = self.get_attribute('ps_modifier').split()
+            modifier_command, range_command = 'ps_modifier', 'ps_modifierrange'
         else:
-            position, mask, action, repeat = self.get_attribute('ps_modifierext').split()
+            modifier_command, range_command = 'ps_modifierext', 'ps_modifierextrange'
+        batch = [(self, modifier_command, '{} {} {} {}'.format(self.position, self.mask, self.action.value,
+                                                                self.repeat))]
+        if self.action != XenaModifierAction.random:
+            batch.append((self, range_command, '{} {} {}'.format(self.min_val, self.step, self.max_val)))
+        return batch
+
+    def _set_index(self, index):
+        """ Change modifier index (in stream) of local object.
+
+        :param index: new modifier index in stream.
+        """
+        self.parent.objects.pop(self.ref)
+        self._data['index'] = '{}/{}'.format(self.parent.index, index)
+        self._data['name'] = self._data['index']
+        self._data['objRef'] = '{}/{}/{}'.format(self.parent.ref, self.type, index)
+        self.parent.objects[self.ref] = self
+
+    def _parse_modifier(self, ps_modifier):
+        position, mask, action, repeat = ps_modifier.split()
         self.position = int(position)
         self.mask = '0x{:x}'.format(int(mask, 16))
         self.action = XenaModifierAction(action)
         self.repeat = int(repeat)
-        if self.action != XenaModifierAction.random:
-            if type(self) == XenaModifier:
-                min_val, step, max_val = self.get_attribute('ps_modifierrange').split()
-            else:
-                min_val, step, max_val = self.get_attribute('ps_modifierextrange').split()
-            self.min_val = int(min_val)
-            self.step = int(step)
-            self.max_val = int(max_val)
 
-    #
-    # Private methods.
-    #
+    def _parse_range(self, ps_modifierrange):
+        min_val, step, max_val = ps_modifierrange.split()
+        self.min_val = int(min_val)
+        self.step = int(step)
+        self.max_val = int(max_val)
 
     def _build_index_command(self, command, *arguments):
         module, port, sid, mid = self.index.split('/')
@@ -253,6 +375,10 @@ class XenaModifier(_XenaModifierBase):
 
     _info_config_commands = ['ps_modifier', 'ps_modifierrange']
 
+    # Standard modifier is 16 bits field, mask is the upper two bytes of 4 bytes hex.
+    default_values = {'position': 0, 'mask': '0xffff0000', 'action': XenaModifierAction.increment, 'repeat': 1,
+                      'min_val': 0, 'step': 1, 'max_val': 0xffff}
+
     def __init__(self, parent, index):
         """
         :param parent: parent stream object.
@@ -265,6 +391,10 @@ class XenaXModifier(_XenaModifierBase):
 
     _info_config_commands = ['ps_modifierext', 'ps_modifierextrange']
 
+    # Extended modifier is 24 bits field, mask is the upper three bytes of 4 bytes hex.
+    default_values = {'position': 0, 'mask': '0xffffff00', 'action': XenaModifierAction.increment, 'repeat': 1,
+                      'min_val': 0, 'step': 1, 'max_val': 0xffffff}
+
     def __init__(self, parent, index):
         """
         :param parent: parent stream object.
@@ -281,3 +411,24 @@ pypacker_2_xena = {'ethernet': 'ethernet',
                    'tcp': 'tcp',
                    'icmp': 'icmp',
                    }
+
+
+def get_headers_protocol(headers):
+    """
+    :param headers: packet headers
+    :type headers: pypacker.layer12.ethernet.Ethernet
+    :return: ps_headerprotocol value (protocol segments) for the packet headers.
+    :raises KeyError: if some pypacker header is not in pypacker_2_xena conversion list.
+    """
+
+    body_handler = headers
+    ps_headerprotocol = []
+    while body_handler:
+        header = str(body_handler).split('(')[0].lower()
+        if header not in pypacker_2_xena:
+            raise KeyError(header)
+        ps_headerprotocol.append(pypacker_2_xena[header])
+        if type(body_handler) is Ethernet and body_handler.vlan:
+            ps_headerprotocol.append('vlan')
+        body_handler = body_handler.body_handler
+    return ' '.join(ps_headerprotocol)